@@ -0,0 +1,75 @@
+"""
+Benchmark memory used by recorded test cases
+
+Compares ``CaseRecord`` against the dict per test case it replaced, holding
+the same values for a synthetic run.
+
+Usage: python benchmarks/bench_case_memory.py [number of cases]
+"""
+import sys
+import tracemalloc
+from datetime import datetime
+
+from pytest_nunit.plugin import CaseRecord
+
+
+def make_dict(nodeid, idref, now):
+    """The dict recorded per test case before CaseRecord, for reference"""
+    return {
+        "setup-report": None,
+        "call-report": None,
+        "teardown-report": None,
+        "idref": idref,
+        "path": "tests/test_module.py",
+        "properties": {"python-version": sys.version, "fspath": "tests/test_module.py"},
+        "attachments": None,
+        "error": "",
+        "stack-trace": "",
+        "name": nodeid,
+        "reason": "",
+        "outcome": "passed",
+        "start": now,
+        "stop": now,
+        "duration": 0,
+        "stdout": "",
+        "stderr": "",
+    }
+
+
+def make_record(nodeid, idref, now):
+    return CaseRecord(
+        nodeid=nodeid,
+        idref=idref,
+        path="tests/test_module.py",
+        name=nodeid,
+        outcome="passed",
+        start=now,
+        stop=now,
+    )
+
+
+def measure(factory, nodeids, now):
+    tracemalloc.start()
+    cases = {nodeid: factory(nodeid, i, now) for i, nodeid in enumerate(nodeids)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cases
+    return size
+
+
+def main(count):
+    now = datetime.utcnow()
+    nodeids = ["tests/test_module.py::test_{0}".format(i) for i in range(count)]
+    as_dict = measure(make_dict, nodeids, now)
+    as_record = measure(make_record, nodeids, now)
+    print("{0} test cases".format(count))
+    print("dict:       {0:.1f} MiB".format(as_dict / 2 ** 20))
+    print(
+        "CaseRecord: {0:.1f} MiB ({1:.0%} saved)".format(
+            as_record / 2 ** 20, 1 - as_record / as_dict
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,75 @@
+"""
+Benchmark sorting recorded test cases into modules
+
+Records a synthetic run through ``NunitXML`` and times building the module
+reports done before the XML is written. The scan over all cases per module
+that was used before can be timed for comparison with ``--reference``; it is
+O(modules x tests), so expect minutes at the default scale.
+
+Usage: python benchmarks/bench_grouping.py [tests] [modules] [--reference]
+"""
+import sys
+import tempfile
+import time
+
+from _pytest.reports import TestReport
+
+from pytest_nunit.plugin import NunitXML
+
+
+def reference_grouping(nunitxml):
+    """The grouping before cases were indexed as recorded, for reference"""
+    modules = {}
+    for module_id in set(nunitxml.node_to_module_map.values()):
+        # Cases are keyed by (nodeid, worker), recorded here without workers
+        cases = {
+            (nodeid, None): nunitxml.cases[nodeid, None]
+            for nodeid, m_id in nunitxml.node_to_module_map.items()
+            if module_id == m_id and (nodeid, None) in nunitxml.cases
+        }
+        modules[module_id] = nunitxml._create_module_report(cases)
+    return modules
+
+
+def main(tests, modules, reference):
+    nunitxml = NunitXML(logfile=tempfile.mktemp(suffix=".xml"), prefix="")
+    nodeids = [
+        "tests/test_{0}.py::test_{1}".format(i % modules, i) for i in range(tests)
+    ]
+    for nodeid in nodeids:
+        nunitxml.node_to_module_map[nodeid] = nodeid.split("::")[0]
+
+    reports = [
+        TestReport(nodeid, (nodeid.split("::")[0], 1, nodeid), {}, "passed", None, when)
+        for nodeid in nodeids
+        for when in ("setup", "call", "teardown")
+    ]
+
+    start = time.perf_counter()
+    for report in reports:
+        nunitxml.pytest_runtest_logreport(report)
+    recorded = time.perf_counter()
+    for module_id, cases in nunitxml.module_cases.items():
+        nunitxml.modules[module_id] = nunitxml._create_module_report(cases)
+    grouped = time.perf_counter()
+
+    print("{0} tests in {1} modules".format(tests, modules))
+    print("recording:           {0:.3f}s".format(recorded - start))
+    print("module reports:      {0:.3f}s".format(grouped - recorded))
+    if reference:
+        start = time.perf_counter()
+        grouping = reference_grouping(nunitxml)
+        print("reference grouping:  {0:.3f}s".format(time.perf_counter() - start))
+        # Both groupings must cover the same cases for the timings to compare
+        assert {m: r.stats for m, r in grouping.items()} == {
+            m: r.stats for m, r in nunitxml.modules.items()
+        }
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    main(
+        int(args[0]) if args else 200000,
+        int(args[1]) if len(args) > 1 else 3000,
+        "--reference" in sys.argv,
+    )
@@ -0,0 +1,70 @@
+"""
+Benchmark rendering of test cases to XML elements
+
+Compares the compiled per-class serializers of ``AttrsXmlRenderer`` against
+the reflective renderer they replaced, on a synthetic report.
+
+Usage: python benchmarks/bench_render.py [number of cases]
+"""
+import enum
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+from cases import make_case
+
+from pytest_nunit.attrs2xml import AttrsXmlRenderer
+
+
+def reflective_as_element(i, name):
+    """The renderer before serializers were compiled, for reference"""
+    el = ET.Element(name)
+    if hasattr(i, "__attrs_attrs__"):
+        for a in i.__attrs_attrs__:
+            if a.metadata["type"] == "attrib" and getattr(i, a.name) is not None:
+                if isinstance(getattr(i, a.name), enum.Enum):
+                    el.set(a.metadata["name"], getattr(i, a.name).name)
+                else:
+                    el.set(a.metadata["name"], str(getattr(i, a.name)))
+            if a.metadata["type"] == "content" and getattr(i, a.name) is not None:
+                el.text = str(getattr(i, a.name))
+            if a.metadata["type"] == "element":
+                attrib = getattr(i, a.name)
+                if attrib is None and not a.metadata["optional"]:
+                    ET.SubElement(el, a.metadata["name"])
+                    continue
+                elif attrib is None and a.metadata["optional"]:
+                    continue
+                if not isinstance(attrib, list):
+                    attrib = [attrib]
+                for item in attrib:
+                    if hasattr(item, "__attrs_attrs__"):
+                        el.append(reflective_as_element(item, a.metadata["name"]))
+                    elif isinstance(item, ET.Element):
+                        item.tag = a.metadata["name"]
+                        el.append(item)
+                    else:
+                        ET.SubElement(el, a.metadata["name"]).text = str(item)
+    return el
+
+
+def main(count):
+    cases = [make_case(i) for i in range(count)]
+
+    def run(render):
+        for case in cases:
+            render(case, "test-case")
+
+    reflective = min(
+        timeit.repeat(lambda: run(reflective_as_element), number=1, repeat=3)
+    )
+    compiled = min(
+        timeit.repeat(lambda: run(AttrsXmlRenderer.as_element), number=1, repeat=3)
+    )
+    print("{0} test cases".format(count))
+    print("reflective: {0:.3f}s".format(reflective))
+    print("compiled:   {0:.3f}s ({1:.2f}x)".format(compiled, reflective / compiled))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,53 @@
+"""
+Benchmark serialization of rendered test cases
+
+Compares the CDATA-aware writer of ``attrs2xml`` against ``ET.tostring`` with
+the patched global serializer it replaced, on a synthetic report.
+
+Usage: python benchmarks/bench_serialize.py [number of cases]
+"""
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+from cases import make_case
+
+from pytest_nunit.attrs2xml import AttrsXmlRenderer, CdataComment, tostring
+
+_serialize_xml = ET._serialize_xml
+
+
+def patched_serialize_xml(write, elem, qnames, namespaces, *args, **kwargs):
+    """The serializer previously patched into ElementTree, for reference"""
+    if isinstance(elem, CdataComment):
+        write("<%s><%s%s]]></%s>" % (elem.tag, "![CDATA[", elem.text, elem.tag))
+        return
+    return _serialize_xml(write, elem, qnames, namespaces, *args, **kwargs)
+
+
+def main(count):
+    elements = [
+        AttrsXmlRenderer.as_element(make_case(i), "test-case") for i in range(count)
+    ]
+
+    def run_patched():
+        ET._serialize_xml = ET._serialize["xml"] = patched_serialize_xml
+        try:
+            for el in elements:
+                ET.tostring(el, encoding="unicode")
+        finally:
+            ET._serialize_xml = ET._serialize["xml"] = _serialize_xml
+
+    def run_writer():
+        for el in elements:
+            tostring(el)
+
+    patched = min(timeit.repeat(run_patched, number=1, repeat=3))
+    writer = min(timeit.repeat(run_writer, number=1, repeat=3))
+    print("{0} test cases".format(count))
+    print("patched ET.tostring: {0:.3f}s".format(patched))
+    print("writer:              {0:.3f}s ({1:.2f}x)".format(writer, patched / writer))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
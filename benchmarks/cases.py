@@ -0,0 +1,38 @@
+"""
+Synthetic test cases for the benchmarks
+"""
+from pytest_nunit.attrs2xml import CdataComment
+from pytest_nunit.models import nunit as models
+
+
+def make_case(i):
+    """A failed test case, with a property and text needing escapes"""
+    return models.TestCaseElementType(
+        id_=str(i),
+        name="test_{0}".format(i),
+        fullname="module.py::test_{0}".format(i),
+        methodname="test_{0}".format(i),
+        properties=models.PropertyBagType(
+            property=[models.PropertyType(name="fspath", value='a "quoted" <path>')]
+        ),
+        environment=None,
+        settings=None,
+        failure=models.FailureType(
+            message=CdataComment(text="assert 1 == 2 & more"),
+            stack_trace=CdataComment(text="module.py:1"),
+        ),
+        reason=models.ReasonType(message=CdataComment(text="")),
+        output=CdataComment(text="line\nline"),
+        assertions=None,
+        attachments=None,
+        classname="module.py",
+        runstate=models.TestRunStateType.Runnable,
+        seed="0",
+        result=models.TestStatusType.Failed,
+        label="",
+        site=None,
+        start_time="",
+        end_time="",
+        duration=0.5,
+        asserts=0,
+    )
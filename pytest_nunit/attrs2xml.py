@@ -1,7 +1,13 @@
 import enum
+import functools
 import xml.etree.ElementTree as ET
+from collections import namedtuple
+from collections.abc import Iterator
 from xml.sax.saxutils import escape
 
+ATTRIB_ENTITIES = {'"': "&quot;", "\r": "&#13;", "\n": "&#10;", "\t": "&#09;"}
+FRAGMENT_CHUNK_SIZE = 1 << 16
+
 
 class CdataComment(ET.Element):
     def __init__(self, text):
@@ -9,59 +15,245 @@ class CdataComment(ET.Element):
         self.text = escape(text, {"\x1b": "&#x1b;"})
 
 
-ET._original_serialize_xml = ET._serialize_xml
+class XmlFragment(ET.Element):
+    """
+    Elements already rendered to the UTF-8 file *path*, which are copied as is
+    when serialized.
+    """
+
+    def __init__(self, path):
+        super(XmlFragment, self).__init__("FRAGMENT!")
+        self.path = path
+
+
+def _escape_text(text):
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _escape_attrib(text):
+    text = _escape_text(text)
+    for char, entity in ATTRIB_ENTITIES.items():
+        if char in text:
+            text = text.replace(char, entity)
+    return text
+
+
+def _attribs(el):
+    return "".join([' %s="%s"' % (k, _escape_attrib(v)) for k, v in el.items()])
+
+
+def serialize(write, elem):
+    """
+    Serialize the element *elem* through the *write* callable.
+
+    A self-contained writer for the elements built by :class:`AttrsXmlRenderer`,
+    with native support for :class:`CdataComment` and :class:`XmlFragment`. It
+    does not touch any global ElementTree state, so it is safe to use from any
+    thread.
+    """
+    tag = elem.tag
+    if elem.__class__ is CdataComment:
+        write("<%s><![CDATA[%s]]></%s>" % (tag, elem.text, tag))
+    elif elem.__class__ is XmlFragment:
+        with open(elem.path, encoding="utf-8") as fragment:
+            read = functools.partial(fragment.read, FRAGMENT_CHUNK_SIZE)
+            for chunk in iter(read, ""):
+                write(chunk)
+    elif len(elem) or elem.text:
+        write("<%s%s>" % (tag, _attribs(elem)))
+        if elem.text:
+            write(_escape_text(elem.text))
+        for child in elem:
+            serialize(write, child)
+        write("</%s>" % tag)
+    else:
+        write("<%s%s />" % (tag, _attribs(elem)))
+    if elem.tail:
+        write(_escape_text(elem.tail))
+
+
+def tostring(elem):
+    """
+    Serialize the element *elem* to a string, see :func:`serialize`
+    """
+    parts = []
+    serialize(parts.append, elem)
+    return "".join(parts)
+
+
+def _is_lazy(value):
+    """
+    Lazy values are iterators (e.g. generators) that are consumed while streaming
+    """
+    return isinstance(value, Iterator)
+
+
+_FieldSpec = namedtuple("_FieldSpec", "attribs content elements")
+
+_FIELD_SPECS = {}
+_SERIALIZERS = {}
+
+
+def _field_spec(cls):
+    """
+    Read the XML mapping out of the attrs metadata of *cls*, once per class
+    """
+    spec = _FIELD_SPECS.get(cls)
+    if spec is None:
+        attribs, content, elements = [], None, []
+        for a in cls.__attrs_attrs__:
+            if a.metadata["type"] == "attrib":
+                attribs.append((a.name, a.metadata["name"]))
+            elif a.metadata["type"] == "content":
+                content = a.name
+            elif a.metadata["type"] == "element":
+                elements.append((a.name, a.metadata["name"], a.metadata["optional"]))
+        spec = _FIELD_SPECS[cls] = _FieldSpec(tuple(attribs), content, tuple(elements))
+    return spec
+
+
+def _attrib_value(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    return str(value)
+
 
+def _append_items(el, key, value):
+    if value.__class__ is not list:
+        value = [value]
+    for item in value:
+        serializer = _SERIALIZERS.get(item.__class__)
+        if serializer is not None:
+            el.append(serializer(item, key))
+        elif hasattr(item, "__attrs_attrs__"):
+            el.append(AttrsXmlRenderer.serializer(item.__class__)(item, key))
+        elif ET.iselement(item):
+            item.tag = key
+            el.append(item)
+        else:
+            ET.SubElement(el, key).text = str(item)
 
-def _serialize_xml(write, elem, qnames, namespaces, *args, **kwargs):
+
+def _compile(cls):
     """
-    Custom serializer to handle CdataComment classes
+    Generate a function rendering instances of the attrs class *cls* to elements.
+
+    The field lookups are unrolled into straight-line code, the same way attrs
+    builds ``__init__``, so no metadata is inspected at render time.
     """
-    if isinstance(elem, CdataComment):
-        write("<%s><%s%s]]></%s>" % (elem.tag, "![CDATA[", elem.text, elem.tag))
-        return
-    return ET._original_serialize_xml(write, elem, qnames, namespaces, *args, **kwargs)
+    attribs, content, elements = _field_spec(cls)
+    lines = ["def as_element(instance, name):", "    attrib = {}"]
+    for field, key in attribs:
+        lines += [
+            "    value = instance.%s" % field,
+            "    if value is not None:",
+            "        attrib[%r] = (" % key,
+            "            value if value.__class__ is str else attrib_value(value)",
+            "        )",
+        ]
+    lines.append("    el = Element(name, attrib)")
+    if content is not None:
+        lines += [
+            "    value = instance.%s" % content,
+            "    if value is not None:",
+            "        el.text = str(value)",
+        ]
+    for field, key, optional in elements:
+        lines += [
+            "    value = instance.%s" % field,
+            "    if value is not None:",
+            "        serializer = serializers.get(value.__class__)",
+            "        if serializer is not None:",
+            "            el.append(serializer(value, %r))" % key,
+            "        else:",
+            "            append_items(el, %r, value)" % key,
+        ]
+        if not optional:
+            lines += ["    else:", "        SubElement(el, %r)" % key]
+    lines.append("    return el")
+
+    namespace = {
+        "Element": ET.Element,
+        "SubElement": ET.SubElement,
+        "attrib_value": _attrib_value,
+        "append_items": _append_items,
+        "serializers": _SERIALIZERS,
+    }
+    exec(
+        compile("\n".join(lines), "<attrs2xml %s>" % cls.__qualname__, "exec"),
+        namespace,
+    )
+    return namespace["as_element"]
 
 
 class AttrsXmlRenderer(object):
+    @staticmethod
+    def serializer(cls):
+        """
+        Get the (cached) element renderer for the attrs class *cls*
+        """
+        serializer = _SERIALIZERS.get(cls)
+        if serializer is None:
+            serializer = _SERIALIZERS[cls] = _compile(cls)
+        return serializer
+
     @staticmethod
     def as_element(i, name):
-        el = ET.Element(name)
         if hasattr(i, "__attrs_attrs__"):
-            for a in i.__attrs_attrs__:
-                if a.metadata["type"] == "attrib" and getattr(i, a.name) is not None:
-                    if isinstance(getattr(i, a.name), enum.Enum):
-                        el.set(a.metadata["name"], getattr(i, a.name).name)
-                    else:
-                        el.set(a.metadata["name"], str(getattr(i, a.name)))
-                if a.metadata["type"] == "content" and getattr(i, a.name) is not None:
-                    el.text = str(getattr(i, a.name))
-                if a.metadata["type"] == "element":
-                    attrib = getattr(i, a.name)
-                    if attrib is None and not a.metadata["optional"]:
-                        ET.SubElement(el, a.metadata["name"])
-                        continue
-                    elif attrib is None and a.metadata["optional"]:
-                        continue
-                    if not isinstance(attrib, list):
-                        attrib = [attrib]
-
-                    for item in attrib:
-                        # If subtype is an attrs instance, recurse
-                        if hasattr(item, "__attrs_attrs__"):
-                            el.append(
-                                AttrsXmlRenderer.as_element(item, a.metadata["name"])
-                            )
-                        elif isinstance(item, ET.Element):
-                            item.tag = a.metadata["name"]
-                            el.append(item)
-                        else:
-                            ET.SubElement(el, a.metadata["name"]).text = str(item)
-
-        return el
+            return AttrsXmlRenderer.serializer(i.__class__)(i, name)
+        return ET.Element(name)
 
     @staticmethod
     def render(instance, node_name):
         root = AttrsXmlRenderer.as_element(instance, node_name)
-        ET._serialize_xml = ET._serialize["xml"] = _serialize_xml
-        s = ET.tostring(root, encoding="UTF-8", method="xml")
-        return s
+        return tostring(root).encode("utf-8")
+
+    @staticmethod
+    def stream(instance, node_name, write):
+        """
+        Serialize *instance* through the *write* callable, one element at a time.
+
+        Element attributes holding a lazy iterator (e.g. a generator) are consumed
+        item by item, so only the item being written is held in memory. Anything
+        else is rendered in one go, producing the same output as :meth:`render`.
+        """
+        attribs, content, elements = _field_spec(instance.__class__)
+        if not any(_is_lazy(getattr(instance, field)) for field, _, _ in elements):
+            write(tostring(AttrsXmlRenderer.as_element(instance, node_name)))
+            return
+
+        el = ET.Element(node_name)
+        for field, key in attribs:
+            value = getattr(instance, field)
+            if value is not None:
+                el.set(key, _attrib_value(value))
+        if content is not None and getattr(instance, content) is not None:
+            el.text = str(getattr(instance, content))
+
+        write("<%s%s>" % (node_name, _attribs(el)))
+        if el.text:
+            write(_escape_text(el.text))
+        for field, name, optional in elements:
+            value = getattr(instance, field)
+            if value is None:
+                if not optional:
+                    write("<%s />" % name)
+                continue
+            if not isinstance(value, list) and not _is_lazy(value):
+                value = [value]
+
+            for item in value:
+                if hasattr(item, "__attrs_attrs__"):
+                    AttrsXmlRenderer.stream(item, name, write)
+                elif ET.iselement(item):
+                    item.tag = name
+                    serialize(write, item)
+                else:
+                    write("<%s>%s</%s>" % (name, _escape_text(str(item)), name))
+        write("</%s>" % node_name)
@@ -0,0 +1,76 @@
+"""
+Detection of tests which got slower than in a baseline
+
+The baseline is a previous report, or the history of ``--nunit-history``.
+"""
+from .history import TIMED_RESULTS, DurationHistory
+from .reader import iter_test_cases
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def load_baseline(path):
+    """
+    Load the durations of the tests in the baseline *path*: the durations of the
+    test cases run in a report, possibly compressed, or the mean durations of an
+    SQLite history.
+
+    :returns: The duration of each test in seconds, by node id
+    :rtype: ``dict``
+    """
+    with open(path, "rb") as fileobj:
+        header = fileobj.read(len(SQLITE_HEADER))
+    if header == SQLITE_HEADER:
+        history = DurationHistory(path)
+        try:
+            return history.mean_durations()
+        finally:
+            history.close()
+    return {
+        case.fullname: float(case.duration)
+        for case in iter_test_cases(path)
+        if case.result in TIMED_RESULTS and case.duration is not None
+    }
+
+
+class Baseline(object):
+    """
+    Compare durations of tests to their *durations* in a baseline.
+
+    A test regressed if it is slower than *ratio* times its baseline and by more
+    than *threshold* seconds, so tests of a few milliseconds do not get flagged for
+    noise. Either criterion is disabled with 0.
+
+    :param durations: The baseline durations, see :func:`load_baseline`
+    :type  durations: ``dict``
+    """
+
+    def __init__(self, durations, ratio=1.5, threshold=0.1):
+        self.durations = durations
+        self.ratio = ratio
+        self.threshold = threshold
+        self.regressions = []  # (nodeid, duration, baseline duration)
+
+    def check(self, nodeid, duration):
+        """
+        Compare the *duration* of the test *nodeid* to its baseline, recording it if
+        it regressed.
+
+        :returns: The baseline duration if the test regressed, else ``None``
+        """
+        baseline = self.durations.get(nodeid)
+        if baseline is None or duration is None:
+            return None
+        if duration <= baseline * self.ratio or duration - baseline <= self.threshold:
+            return None
+        self.regressions.append((nodeid, duration, baseline))
+        return baseline
+
+
+def format_regression(duration, baseline):
+    """Describe a regression, e.g. ``1.250000s, x2.50 of 0.500000s``"""
+    if baseline:
+        return "{0:.6f}s, x{1:.2f} of {2:.6f}s".format(
+            duration, duration / baseline, baseline
+        )
+    return "{0:.6f}s, +{0:.6f}s of 0s".format(duration)
@@ -0,0 +1,66 @@
+"""
+Stream of test case events, as newline delimited JSON (NDJSON)
+
+Each completed test case is written as one line, so the results can be followed
+while the tests run and replayed later into a report, see
+:mod:`pytest_nunit.replay`.
+"""
+import json
+import os
+import threading
+
+FLUSH_INTERVAL = 0.25  # seconds
+
+
+class EventWriter(object):
+    """
+    Write events to *path*, one JSON object per line.
+
+    Lines are buffered and flushed to the file by a background thread every
+    *flush_interval* seconds, so readers tailing the file see each event shortly
+    after it is written without a system call per event. The directory of *path*
+    is created if it does not exist.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.fileobj = open(path, "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.flush_interval = flush_interval
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="pytest-nunit-events", daemon=True
+        )
+        self.flusher.start()
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_interval):
+            with self.lock:
+                self.fileobj.flush()
+
+    def write(self, event):
+        """Write *event*, a JSON serializable dict."""
+        line = json.dumps(event, default=str) + "\n"
+        with self.lock:
+            self.fileobj.write(line)
+
+    def close(self):
+        """Flush the remaining events and close the file."""
+        self.closed.set()
+        self.flusher.join()
+        self.fileobj.close()
+
+
+def read_events(path):
+    """
+    Generate the events written to *path*.
+
+    An incomplete last line, from a writer which was interrupted, is ignored.
+    """
+    with open(path, encoding="utf-8") as fileobj:
+        for line in fileobj:
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
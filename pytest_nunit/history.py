@@ -0,0 +1,197 @@
+"""
+History of test durations, and planning of shards from it
+
+Usage::
+
+    python -m pytest_nunit.history history.db report.xml [report.xml.gz ...]
+
+The history is an SQLite file with rolling statistics of the recent durations of
+each test, fed from reports with the command above or from the live run with
+``--nunit-history``. ``--nunit-shard`` uses it to split the tests into shards of
+equal predicted duration.
+"""
+import argparse
+import heapq
+import math
+import sqlite3
+
+from .models.nunit import TestStatusType
+from .reader import iter_test_cases
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    nodeid TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    variance REAL NOT NULL,
+    last REAL NOT NULL
+)
+"""
+
+# New tests start from empty statistics, updated as any other. Unlike an upsert
+# (ON CONFLICT), this works with SQLite older than 3.24.
+INSERT_TEST = "INSERT OR IGNORE INTO durations VALUES (?, 0, 0.0, 0.0, 0.0)"
+
+# Number of recent runs the statistics mostly reflect
+WINDOW = 20
+
+# Exponentially weighted update of the mean and variance, so older durations
+# age out once a test gets faster or slower. The weight of a new duration is
+# 1 / WINDOW, or 1 / count while there are fewer runs: the statistics of the
+# first runs are then their plain mean and (population) variance. The
+# expressions on the right of SET see the values before the update.
+ADD_DURATION = """
+UPDATE durations SET
+    count = count + 1,
+    mean = mean + MAX(1.0 / (count + 1), {weight}) * (?1 - mean),
+    variance = (1 - MAX(1.0 / (count + 1), {weight})) * (
+        variance + MAX(1.0 / (count + 1), {weight}) * (?1 - mean) * (?1 - mean)
+    ),
+    last = ?1
+WHERE nodeid = ?2
+""".format(weight=1.0 / WINDOW)
+
+# Results whose duration is that of the test, skipped tests do not run
+TIMED_RESULTS = (TestStatusType.Passed, TestStatusType.Failed, TestStatusType.Warning)
+
+
+class DurationStats(object):
+    """
+    The statistics of the recent durations of a test, in seconds, see
+    :data:`WINDOW`.
+    """
+
+    __slots__ = ("count", "mean", "variance", "last")
+
+    def __init__(self, count, mean, variance, last):
+        self.count = count
+        self.mean = mean
+        self.variance = variance
+        self.last = last
+
+    @property
+    def stddev(self):
+        """The standard deviation of the recent durations."""
+        return math.sqrt(self.variance)
+
+
+class DurationHistory(object):
+    """
+    The durations of tests, stored in the SQLite file *path*.
+
+    :param path: The path of the history, created if it does not exist
+    :type  path: ``str``
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(SCHEMA)
+
+    def add(self, durations):
+        """
+        Add the durations of tests, in one transaction.
+
+        :param durations: Pairs of node id and duration in seconds
+        :type  durations: iterable of ``tuple``
+        """
+        durations = list(durations)
+        with self.connection:
+            self.connection.executemany(
+                INSERT_TEST, ((nodeid,) for nodeid, _ in durations)
+            )
+            self.connection.executemany(
+                ADD_DURATION, ((duration, nodeid) for nodeid, duration in durations)
+            )
+
+    def add_report(self, path):
+        """
+        Add the durations of the test cases run in the report *path*, streamed one
+        test case at a time.
+
+        :returns: The number of durations added
+        """
+        durations = [
+            (case.fullname, float(case.duration))
+            for case in iter_test_cases(path)
+            if case.result in TIMED_RESULTS and case.duration is not None
+        ]
+        self.add(durations)
+        return len(durations)
+
+    def get(self, nodeid):
+        """
+        :returns: The statistics of the test *nodeid*, or ``None`` if unknown
+        :rtype: :class:`DurationStats`
+        """
+        row = self.connection.execute(
+            "SELECT count, mean, variance, last FROM durations WHERE nodeid = ?",
+            (nodeid,),
+        ).fetchone()
+        return DurationStats(*row) if row else None
+
+    def mean_durations(self):
+        """
+        :returns: The mean duration of every test in the history, by node id
+        :rtype: ``dict``
+        """
+        return dict(self.connection.execute("SELECT nodeid, mean FROM durations"))
+
+    def close(self):
+        self.connection.close()
+
+
+def partition(weights, count):
+    """
+    Split items into *count* parts of about equal total weight.
+
+    Greedy longest processing time first: the heaviest remaining item goes to the
+    lightest part. The result only depends on *weights*, so every shard of a run
+    computes the same partition.
+
+    :param weights: The weight of each item, in a stable order
+    :type  weights: ``list`` of ``float``
+
+    :returns: The part of each item, in the order of *weights*
+    :rtype: ``list`` of ``int``
+    """
+    parts = [0] * len(weights)
+    loads = [(0.0, part) for part in range(count)]
+    # Sorting is stable, equal weights keep their order
+    for index in sorted(range(len(weights)), key=lambda i: -weights[i]):
+        load, part = heapq.heappop(loads)
+        parts[index] = part
+        heapq.heappush(loads, (load + weights[index], part))
+    return parts
+
+
+def predict_durations(nodeids, durations):
+    """
+    Predict the duration of the tests *nodeids* from the mean *durations* of the
+    history. Tests without history are predicted to take the mean of the known
+    tests, or all the same time with no history at all.
+
+    :rtype: ``list`` of ``float``
+    """
+    known = [durations[nodeid] for nodeid in nodeids if nodeid in durations]
+    default = sum(known) / len(known) if known else 1.0
+    return [durations.get(nodeid, default) for nodeid in nodeids]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pytest_nunit.history", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("history", help="the path of the history file")
+    parser.add_argument("reports", nargs="+", metavar="report", help="a report to add")
+    args = parser.parse_args(args)
+    history = DurationHistory(args.history)
+    try:
+        for path in args.reports:
+            count = history.add_report(path)
+            print("{0}: {1} durations added".format(path, count))
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
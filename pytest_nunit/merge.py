@@ -0,0 +1,326 @@
+"""
+Merge NUnit reports, e.g. of a test suite sharded over several machines
+
+Usage::
+
+    python -m pytest_nunit.merge -o merged.xml shard-1.xml shard-2.xml.gz ...
+
+Each report is streamed with ``iterparse``: its test cases are copied, with new
+ids, to a spool file per test suite and cleared, so memory use does not grow
+with the size of the reports. Test suites with the same full name are merged,
+and all totals are recomputed from the test cases.
+"""
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from .attrs2xml import AttrsXmlRenderer, XmlFragment, serialize
+from .models.nunit import (
+    FailureSiteType,
+    TestResultType,
+    TestRunStateType,
+    TestRunType,
+    TestStatusType,
+    TestSuiteElementType,
+    TestSuiteTypeType,
+)
+from .output import open_report, read_report
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+FIRST_ID = 100
+
+# Elements of a test suite other than its tests, tag -> model field
+SUITE_ELEMENTS = {
+    "properties": "properties",
+    "environment": "environment",
+    "settings": "settings",
+    "failure": "failure",
+    "reason": "reason",
+    "output": "output",
+    "assertions": "assertions",
+    "attachments": "attachments",
+}
+
+
+def _parse_time(text):
+    try:
+        return datetime.strptime(text, TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def _enum(enum_type, value, default=None):
+    try:
+        return enum_type(value)
+    except ValueError:
+        return default
+
+
+class _Totals(object):
+    """Totals of test cases, counted from the attributes of their elements."""
+
+    __slots__ = (
+        "total",
+        "passed",
+        "failed",
+        "skipped",
+        "warnings",
+        "inconclusive",
+        "asserts",
+        "duration",
+        "start",
+        "end",
+    )
+
+    def __init__(self):
+        self.total = 0
+        self.passed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.warnings = 0
+        self.inconclusive = 0
+        self.asserts = 0
+        self.duration = 0.0
+        self.start = None
+        self.end = None
+
+    def add(self, attrib):
+        self.total += 1
+        result = attrib.get("result")
+        if result == "Passed":
+            self.passed += 1
+        elif result == "Failed":
+            self.failed += 1
+        elif result == "Skipped":
+            self.skipped += 1
+        elif result == "Warning":
+            self.warnings += 1
+        else:
+            self.inconclusive += 1
+        self.asserts += int(attrib.get("asserts", 0))
+        self.duration += float(attrib.get("duration", 0))
+        # Times of the same format sort as text
+        start, end = attrib.get("start-time"), attrib.get("end-time")
+        if start is not None and (self.start is None or start < self.start):
+            self.start = start
+        if end is not None and (self.end is None or end > self.end):
+            self.end = end
+
+    def result(self, status_type):
+        if self.failed:
+            return status_type.Failed
+        if self.warnings:
+            return status_type.Warning
+        return status_type.Passed
+
+    def elapsed(self):
+        """
+        Time from the first start to the last end, or the total duration of the
+        test cases if the times cannot be parsed.
+        """
+        start, end = _parse_time(self.start), _parse_time(self.end)
+        if start is None or end is None:
+            return self.duration
+        return (end - start).total_seconds()
+
+
+class _Suite(object):
+    """A test suite merged from one or more reports."""
+
+    __slots__ = ("attrib", "elements", "fragment", "totals")
+
+    def __init__(self, attrib, fragment):
+        self.attrib = dict(attrib)  # Of the first report with the suite
+        self.elements = None  # Other than tests, of the first report
+        self.fragment = fragment  # Path of the spooled test cases
+        self.totals = _Totals()
+
+    def as_model(self):
+        attrib, totals = self.attrib, self.totals
+        elements = self.elements or {}
+        return TestSuiteElementType(
+            id_=attrib.get("id", ""),
+            name=attrib.get("name", ""),
+            fullname=attrib.get("fullname"),
+            methodname=attrib.get("methodname"),
+            classname=attrib.get("classname"),
+            test_suite=None,
+            # An iterator, so the test cases are copied in chunks when streamed
+            test_case=iter([XmlFragment(self.fragment)]) if totals.total else None,
+            runstate=_enum(
+                TestRunStateType, attrib.get("runstate"), TestRunStateType.Runnable
+            ),
+            type_=_enum(
+                TestSuiteTypeType, attrib.get("type"), TestSuiteTypeType.Assembly
+            ),
+            testcasecount=totals.total,
+            result=totals.result(TestStatusType),
+            label=attrib.get("label"),
+            site=_enum(FailureSiteType, attrib.get("site")),
+            start_time=totals.start,
+            end_time=totals.end,
+            duration=totals.elapsed(),
+            asserts=totals.asserts,
+            total=totals.total,
+            passed=totals.passed,
+            failed=totals.failed,
+            warnings=totals.warnings,
+            inconclusive=totals.inconclusive,
+            skipped=totals.skipped,
+            **{field: elements.get(field) for field in SUITE_ELEMENTS.values()}
+        )
+
+
+def _suite_elements(parent):
+    elements = {}
+    for child in parent:
+        if child.tag in SUITE_ELEMENTS:
+            child.tail = None
+            elements[SUITE_ELEMENTS[child.tag]] = child
+    return elements
+
+
+def _read(path, suites, run, spool_dir, ids):
+    """
+    Stream the report *path*, spooling its test cases into *suites*.
+
+    Test cases and test suites are removed from their parent once read, so only
+    the path from the root to the current element, with the other elements of
+    the suites on that path, is held in memory. The other elements of a suite are
+    taken at its end, as they may follow its tests.
+    """
+    elements = []  # From the root to the current element
+    suite_stack = []  # Suites being read, innermost last
+    fragment_suite, fragment = None, None  # Spool file being written
+    try:
+        with read_report(path) as fileobj:
+            for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    if tag == "test-suite":
+                        key = elem.get("fullname") or elem.get("name")
+                        if key not in suites:
+                            suites[key] = _Suite(
+                                elem.attrib,
+                                os.path.join(spool_dir, "{0}.xml".format(len(suites))),
+                            )
+                        suite_stack.append(suites[key])
+                    elif tag == "test-run" and not run.attrib:
+                        run.attrib = dict(elem.attrib)
+                    elements.append(elem)
+                    continue
+
+                elements.pop()
+                if tag == "test-case":
+                    if not suite_stack:
+                        raise ValueError(
+                            "{0}: test case outside of a test suite".format(path)
+                        )
+                    suite = suite_stack[-1]
+                    if suite is not fragment_suite:
+                        if fragment is not None:
+                            fragment.close()
+                        fragment_suite = suite
+                        fragment = open(suite.fragment, "a", encoding="utf-8")
+                    elem.set("id", str(next(ids)))
+                    elem.tail = None
+                    serialize(fragment.write, elem)
+                    suite.totals.add(elem.attrib)
+                    run.totals.add(elem.attrib)
+                    elements[-1].remove(elem)
+                elif tag == "test-suite":
+                    suite = suite_stack.pop()
+                    if suite.elements is None:
+                        suite.elements = _suite_elements(elem)
+                    if elements:
+                        elements[-1].remove(elem)
+    finally:
+        if fragment is not None:
+            fragment.close()
+
+
+class _Run(object):
+    __slots__ = ("attrib", "totals")
+
+    def __init__(self):
+        self.attrib = {}  # Of the first report
+        self.totals = _Totals()
+
+
+def merge(inputs, output, compresslevel=None):
+    """
+    Merge the reports *inputs* into the report *output*.
+
+    Reports may be compressed, see :func:`pytest_nunit.output.read_report`.
+    Test case ids are numbered again, so they are unique in the merged report.
+
+    :param inputs: The paths of the reports to merge
+    :type  inputs: ``list``
+
+    :param output: The path of the merged report
+    :type  output: ``str``
+
+    :param compresslevel: The compression level of *output*, if compressed
+    :type  compresslevel: ``int``
+    """
+    suites = {}  # full name -> _Suite
+    run = _Run()
+    ids = itertools.count(FIRST_ID)
+    spool_dir = tempfile.mkdtemp(prefix="pytest-nunit-")
+    try:
+        for path in inputs:
+            _read(path, suites, run, spool_dir, ids)
+
+        totals = run.totals
+        test_run = TestRunType(
+            id_=run.attrib.get("id", "2"),
+            testcasecount=totals.total,
+            result=totals.result(TestResultType),
+            start_time=totals.start,
+            end_time=totals.end,
+            duration=totals.elapsed(),
+            total=totals.total,
+            passed=totals.passed,
+            failed=totals.failed,
+            inconclusive=totals.inconclusive,
+            skipped=totals.skipped,
+            asserts=totals.asserts,
+            command_line=None,
+            filter_=None,
+            test_case=None,
+            test_suite=(suite.as_model() for suite in suites.values()),
+            engine_version=run.attrib.get("engine-version"),
+            clr_version=run.attrib.get("clr-version"),
+        )
+        with open_report(output, compresslevel) as fileobj:
+            AttrsXmlRenderer.stream(
+                test_run, "test-run", lambda chunk: fileobj.write(chunk.encode("utf-8"))
+            )
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pytest_nunit.merge", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("inputs", nargs="+", metavar="report", help="a report to merge")
+    parser.add_argument(
+        "-o", "--output", required=True, help="the path of the merged report"
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        default=None,
+        help="compression level of an output ending in .gz, .bz2, .xz or .zst",
+    )
+    args = parser.parse_args(args)
+    merge(args.inputs, args.output, args.compression_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -455,7 +455,7 @@ class TestCaseElementType(object):
         type="PropertyBagType",
     )
     environment = attr.ib(
-        metadata={"name": "environment", "type": "element", "optional": False},
+        metadata={"name": "environment", "type": "element", "optional": True},
         type="EnvironmentType",
     )
     settings = attr.ib(
@@ -572,7 +572,7 @@ class TestSuiteElementType(object):
         default=attr.NOTHING,
     )
     environment = attr.ib(
-        metadata={"name": "environment", "type": "element", "optional": False},
+        metadata={"name": "environment", "type": "element", "optional": True},
         type="EnvironmentType",
     )
     settings = attr.ib(
@@ -4,8 +4,6 @@ import os
 import platform
 import sys
 
-from _pytest._code.code import ExceptionChainRepr
-
 from .attrs2xml import AttrsXmlRenderer, CdataComment
 from .models.nunit import (AttachmentsType, AttachmentType, EnvironmentType,
                            FailureType, PropertyBagType, PropertyType,
@@ -22,6 +20,7 @@ PYTEST_TO_NUNIT = {
     "passed": TestStatusType.Passed,
     "failed": TestStatusType.Failed,
     "skipped": TestStatusType.Skipped,
+    "warning": TestStatusType.Warning,
 }
 
 
@@ -52,7 +51,7 @@ def _format_attachments(case, attach_on):
     Format an attachment list for a test case
 
     :param case: The test case
-    :type  case: :class:`pytest.TestCase`
+    :type  case: :class:`pytest_nunit.plugin.CaseRecord`
 
     :param attach_on: Attach-on criteria, one of any|pass|fail
     :type  attach_on: ``str``
@@ -60,8 +59,8 @@ def _format_attachments(case, attach_on):
     :returns: a formatted attachment list
     :rtype: :class:`AttachmentsType`
     """
-    if case["attachments"]:
-        result = PYTEST_TO_NUNIT.get(case["outcome"], TestStatusType.Inconclusive)
+    if case.attachments:
+        result = PYTEST_TO_NUNIT.get(case.outcome, TestStatusType.Inconclusive)
         # Guard clauses
         include_attachments = attach_on == "any"
 
@@ -74,12 +73,38 @@ def _format_attachments(case, attach_on):
             return AttachmentsType(
                 attachment=[
                     AttachmentType(filePath=k, description=v)
-                    for k, v in case["attachments"].items()
+                    for k, v in case.attachments.items()
                 ]
             )
     return None
 
 
+PHASES = ("setup", "call", "teardown")
+
+
+def _format_properties(case):
+    """
+    Format the property list of a test case, with its custom properties
+
+    :param case: The test case
+    :type  case: :class:`pytest_nunit.plugin.CaseRecord`
+
+    :rtype: :class:`PropertyBagType`
+    """
+    properties = {"python-version": sys.version, "fspath": case.path}
+    if case.worker is not None:
+        properties["worker"] = case.worker
+    for phase in PHASES:
+        duration = getattr(case, phase + "_duration")
+        if duration is not None:
+            properties[phase + "-duration"] = "{0:.6f}".format(duration)
+    if case.properties:
+        properties.update(case.properties)
+    return PropertyBagType(
+        property=[PropertyType(name=k, value=v) for k, v in properties.items()]
+    )
+
+
 def _format_filters(filters_):
     """
     Create a filter list
@@ -129,73 +154,102 @@ class NunitTestRun(object):
 
     def __init__(self, nunitxml):
         self.nunitxml = nunitxml
+        self._environment = None
 
     @property
     def environment(self):
-        return EnvironmentType(
-            framework_version=FRAMEWORK_VERSION,
-            clr_version=CLR_VERSION,
-            os_version=platform.release(),
-            platform=platform.system(),
-            cwd=os.getcwd(),
-            machine_name=platform.machine(),
-            user=_get_user_id()[0] if self.nunitxml.show_username else "",
-            user_domain=_get_user_id()[1] if self.nunitxml.show_user_domain else "",
-            culture=_getlocale(),
-            uiculture=_getlocale(),
-            os_architecture=platform.architecture()[0],
-        )
+        """
+        The run environment, computed once as gathering it can be expensive
+        (``platform.architecture()`` may spawn a process).
+        """
+        if self._environment is None:
+            show_user = self.nunitxml.show_username or self.nunitxml.show_user_domain
+            user_id = _get_user_id() if show_user else ("", "")
+            culture = _getlocale()
+            self._environment = EnvironmentType(
+                framework_version=FRAMEWORK_VERSION,
+                clr_version=CLR_VERSION,
+                os_version=platform.release(),
+                platform=platform.system(),
+                cwd=os.getcwd(),
+                machine_name=platform.machine(),
+                user=user_id[0] if self.nunitxml.show_username else "",
+                user_domain=user_id[1] if self.nunitxml.show_user_domain else "",
+                culture=culture,
+                uiculture=culture,
+                os_architecture=platform.architecture()[0],
+            )
+        return self._environment
+
+    @property
+    def case_environment(self):
+        """
+        The environment of each test case, unless only reported on test suites
+        """
+        if self.nunitxml.environment_on == "suite":
+            return None
+        return self.environment
 
     def test_cases(self, module):
-        return [
-            TestCaseElementType(
-                id_=str(case["idref"]),
-                name=case["name"],
-                fullname=nodeid,
-                methodname=get_node_names(nodeid)[1],
-                properties=PropertyBagType(
-                    property=[
-                        PropertyType(name=k, value=v)
-                        for k, v in case["properties"].items()
-                    ]
-                ),
-                environment=self.environment,
-                settings=None,  # TODO : Add settings as optional fixture
-                failure=FailureType(
-                    message=CdataComment(
-                        text=str(case["error"])
-                    ),
-                    stack_trace=CdataComment(
-                        text=str(case["error"].reprcrash)
-                        if isinstance(case["error"], ExceptionChainRepr)
-                        else case["stack-trace"]
-                    ),
-                ),
-                reason=ReasonType(message=CdataComment(text=case["reason"])),
-                output=CdataComment(text=case["reason"]),
-                assertions=_format_assertions(case),
-                attachments=_format_attachments(case, self.nunitxml.attach_on),
-                classname=get_node_names(nodeid)[0],
-                runstate=TestRunStateType.Skipped
-                if case["outcome"] == "skipped"
-                else TestRunStateType.Runnable,
-                seed=str(sys.flags.hash_randomization),
-                result=PYTEST_TO_NUNIT.get(
-                    case["outcome"], TestStatusType.Inconclusive
+        return list(self.iter_test_cases(module))
+
+    def test_case(self, case):
+        """
+        Convert a recorded test case
+
+        :param case: The test case
+        :type  case: :class:`pytest_nunit.plugin.CaseRecord`
+        """
+        return TestCaseElementType(
+            id_=self.nunitxml.id_prefix + str(case.idref),
+            name=case.name,
+            fullname=case.nodeid,
+            methodname=get_node_names(case.nodeid)[1],
+            properties=_format_properties(case),
+            environment=self.case_environment,
+            settings=None,  # TODO : Add settings as optional fixture
+            failure=FailureType(
+                message=CdataComment(
+                    text=str(case.error)
                 ),
-                label=self.nunitxml.node_descriptions[nodeid],
-                site=None,
-                start_time=case["start"].strftime("%Y-%m-%d %H:%M:%S.%f"),
-                end_time=case["stop"].strftime("%Y-%m-%d %H:%M:%S.%f"),
-                duration=case["duration"],
-                asserts=0,  # TODO : Add assert count
-            )
-            for nodeid, case in self.nunitxml.modules[module].cases.items()
-        ]
+                stack_trace=CdataComment(text=case.stack_trace),
+            ),
+            reason=ReasonType(message=CdataComment(text=case.reason)),
+            output=CdataComment(text=case.reason),
+            assertions=_format_assertions(case),
+            attachments=_format_attachments(case, self.nunitxml.attach_on),
+            classname=get_node_names(case.nodeid)[0],
+            runstate=TestRunStateType.Skipped
+            if case.outcome == "skipped"
+            else TestRunStateType.Runnable,
+            seed=str(sys.flags.hash_randomization),
+            result=PYTEST_TO_NUNIT.get(
+                case.outcome, TestStatusType.Inconclusive
+            ),
+            label=self.nunitxml.node_descriptions[case.nodeid],
+            site=None,
+            start_time=case.start.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            end_time=case.stop.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            duration=case.duration,
+            asserts=0,  # TODO : Add assert count
+        )
+
+    def iter_test_cases(self, module):
+        return (
+            self.test_case(case)
+            for case in self.nunitxml.modules[module].cases.values()
+        )
 
     @property
     def test_suites(self):
-        return [
+        return list(self.iter_test_suites())
+
+    def iter_test_suites(self, lazy=False):
+        """
+        Generate the test suites, with the test cases of each suite generated
+        on demand if *lazy* is set.
+        """
+        return (
             TestSuiteElementType(
                 id_=nodeid,
                 name=nodeid,
@@ -213,7 +267,9 @@ class NunitTestRun(object):
                 output=None,
                 assertions=None,
                 attachments=None,
-                test_case=self.test_cases(nodeid),
+                test_case=self.iter_test_cases(nodeid)
+                if lazy
+                else self.test_cases(nodeid),
                 runstate=TestRunStateType.Runnable,
                 type_=TestSuiteTypeType.Assembly,
                 testcasecount=module.stats["total"],
@@ -227,14 +283,14 @@ class NunitTestRun(object):
                 total=module.stats["total"],
                 passed=module.stats["passed"],
                 failed=module.stats["failure"],
-                warnings=0,
+                warnings=module.stats["warnings"],
                 inconclusive=0,
                 skipped=module.stats["skipped"],
             )
             for nodeid, module in self.nunitxml.modules.items()
-        ]
+        )
 
-    def as_test_run(self):
+    def as_test_run(self, lazy=False):
         return TestRunType(
             id_="2",
             testcasecount=self.nunitxml.stats["total"],
@@ -251,7 +307,7 @@ class NunitTestRun(object):
             command_line=" ".join(sys.argv),
             filter_=_format_filters(self.nunitxml.filters),
             test_case=None,
-            test_suite=self.test_suites,
+            test_suite=self.iter_test_suites(lazy=True) if lazy else self.test_suites,
             engine_version=FRAMEWORK_VERSION,
             clr_version=CLR_VERSION,
         )
@@ -259,3 +315,11 @@ class NunitTestRun(object):
     def generate_xml(self):
         tr = self.as_test_run()
         return AttrsXmlRenderer.render(tr, "test-run")
+
+    def stream_xml(self, write):
+        """
+        Write the report through *write* as it is generated, one test case at a
+        time, instead of building the whole document first.
+        """
+        tr = self.as_test_run(lazy=True)
+        AttrsXmlRenderer.stream(tr, "test-run", write)
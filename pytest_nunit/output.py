@@ -0,0 +1,180 @@
+"""
+Writing and reading of report files, compressed according to their extension
+"""
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import stat
+
+try:
+    import zstandard
+except ImportError:  # Optional, see the "zstd" extra
+    zstandard = None
+
+
+def _zstd_writer(fileobj, path, compresslevel):
+    if compresslevel is None:
+        compressor = zstandard.ZstdCompressor()
+    else:
+        compressor = zstandard.ZstdCompressor(level=compresslevel)
+    return compressor.stream_writer(fileobj, closefd=False)
+
+
+def _gzip_writer(fileobj, path, compresslevel):
+    # The file name is stored in the gzip header, use the final one
+    if compresslevel is None:
+        return gzip.GzipFile(filename=path, mode="wb", fileobj=fileobj)
+    return gzip.GzipFile(
+        filename=path, mode="wb", compresslevel=compresslevel, fileobj=fileobj
+    )
+
+
+def _bz2_writer(fileobj, path, compresslevel):
+    if compresslevel is None:
+        return bz2.BZ2File(fileobj, "wb")
+    return bz2.BZ2File(fileobj, "wb", compresslevel=compresslevel)
+
+
+def _xz_writer(fileobj, path, compresslevel):
+    return lzma.LZMAFile(fileobj, "wb", preset=compresslevel)
+
+
+COMPRESSORS = {
+    ".gz": _gzip_writer,
+    ".bz2": _bz2_writer,
+    ".xz": _xz_writer,
+    ".zst": _zstd_writer,
+}
+
+
+def get_compression(path):
+    """
+    Get the compression extension of *path*, or ``None`` for a plain file.
+
+    :raises ValueError: if the compression requires a module which is not installed
+    """
+    for extension in COMPRESSORS:
+        if path.endswith(extension):
+            if extension == ".zst" and zstandard is None:
+                raise ValueError(
+                    "zstandard must be installed to write {0} files".format(extension)
+                )
+            return extension
+    return None
+
+
+def check_compresslevel(path, compresslevel):
+    """
+    Check that *compresslevel* is a valid level for the compression of *path*,
+    by compressing nothing with it, so invalid levels fail before any report is
+    written.
+
+    :raises ValueError: if the level is invalid
+    """
+    compression = get_compression(path)
+    if compression is None or compresslevel is None:
+        return
+    try:
+        with COMPRESSORS[compression](io.BytesIO(), path, compresslevel):
+            pass
+    except (ValueError, OverflowError, lzma.LZMAError) as e:
+        raise ValueError(
+            "invalid compression level {0} for {1} files: {2}".format(
+                compresslevel, compression, e
+            )
+        )
+
+
+@contextlib.contextmanager
+def _writer(fileobj, path, compresslevel):
+    compression = get_compression(path)
+    if compression is None:
+        yield fileobj
+        return
+    with COMPRESSORS[compression](fileobj, path, compresslevel) as writer:
+        yield writer
+
+
+def _is_special_file(path):
+    try:
+        return not stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+@contextlib.contextmanager
+def open_report(path, compresslevel=None, fsync=False):
+    """
+    Open *path* for writing the report as bytes, compressed on the fly when the
+    path ends in ``.gz``, ``.bz2``, ``.xz`` or ``.zst``.
+
+    The report is written to a hidden temporary file next to *path*, which is
+    renamed to *path* once complete. Readers never see a partial report, even if
+    the process is killed while writing. Special files such as ``/dev/stdout``
+    are written to directly.
+
+    :param path: The path of the report file
+    :type  path: ``str``
+
+    :param compresslevel: The compression level, defaults to the level of the
+        compression library
+    :type  compresslevel: ``int``
+
+    :param fsync: Flush the report to disk before it is renamed into place
+    :type  fsync: ``bool``
+
+    :returns: a binary file object
+    """
+    if _is_special_file(path):
+        with open(path, "wb") as fileobj, _writer(
+            fileobj, path, compresslevel
+        ) as writer:
+            yield writer
+        return
+
+    dirname, basename = os.path.split(path)
+    tmp_path = os.path.join(dirname, ".{0}.{1}.tmp".format(basename, os.getpid()))
+    try:
+        with open(tmp_path, "wb") as fileobj:
+            with _writer(fileobj, path, compresslevel) as writer:
+                yield writer
+            if fsync:
+                fileobj.flush()
+                os.fsync(fileobj.fileno())
+        os.replace(tmp_path, path)
+        if fsync and hasattr(os, "O_DIRECTORY"):
+            dirfd = os.open(dirname or ".", os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dirfd)
+            finally:
+                os.close(dirfd)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+@contextlib.contextmanager
+def read_report(path):
+    """
+    Open the report *path* for reading as bytes, decompressed on the fly when the
+    path ends in ``.gz``, ``.bz2``, ``.xz`` or ``.zst``.
+
+    :raises ValueError: if the compression requires a module which is not installed
+
+    :returns: a binary file object
+    """
+    compression = get_compression(path)
+    if compression == ".zst":
+        with open(path, "rb") as fileobj:
+            with zstandard.ZstdDecompressor().stream_reader(fileobj) as reader:
+                yield reader
+        return
+    with _OPENERS.get(compression, open)(path, "rb") as fileobj:
+        yield fileobj
@@ -5,18 +5,36 @@ Based (loosely) on the Junit XML output.
 
 Shares the same pattern of CLI options for ease of use.
 """
+import argparse
 import functools
 import logging
 import os
-import sys
-from collections import Counter, defaultdict, namedtuple
-from datetime import datetime
-from io import open
+import shutil
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
 
 import pytest
 from _pytest.config import filename_arg
 
+from .baseline import Baseline, format_regression, load_baseline
+from .events import EventWriter
+from .history import DurationHistory, partition, predict_durations
+from .models.nunit import TestStatusType
 from .nunit import NunitTestRun
+from .output import check_compresslevel, get_compression, open_report
+from .reader import iter_test_cases
+from .spool import (
+    Snapshots,
+    SpooledTestRun,
+    WorkerSpool,
+    dump_spool,
+    load_spool,
+    read_spool,
+    write_spool,
+)
 
 log = logging.getLogger(__name__)
 
@@ -24,24 +42,396 @@ log = logging.getLogger(__name__)
 PytestFilters = namedtuple("PytestFilters", "keyword markers file_or_dir")
 ModuleReport = namedtuple("ModuleReport", "stats cases start stop duration")
 ParentlessNode = "PARENTLESS_NODE"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 
-if sys.version_info < (3,):
 
-    def min_with_default(seq, default):
+class CaseRecord(object):
+    """
+    The data recorded for a test case, in a compact form as there is one per test.
+
+    Only the values needed for the report are extracted from the test reports,
+    so the reports (and their tracebacks) can be released.
+    """
+
+    __slots__ = (
+        "nodeid",
+        "worker",
+        "module_id",
+        "setup_outcome",
+        "call_outcome",
+        "idref",
+        "path",
+        "properties",
+        "attachments",
+        "error",
+        "stack_trace",
+        "name",
+        "reason",
+        "outcome",
+        "start",
+        "stop",
+        "duration",
+        "setup_duration",
+        "call_duration",
+        "teardown_duration",
+        "stdout",
+        "stderr",
+    )
+
+    def __init__(
+        self,
+        nodeid="",
+        worker=None,
+        module_id=ParentlessNode,
+        setup_outcome=None,
+        idref=0,
+        path=None,
+        properties=None,
+        name="",
+        outcome="",
+        start=datetime.min,
+        stop=datetime.min,
+    ):
+        self.nodeid = nodeid
+        self.worker = worker  # Id of the pytest-xdist worker which ran the test
+        self.module_id = module_id
+        self.setup_outcome = setup_outcome
+        self.call_outcome = None  # Not called when setup failed or skipped
+        self.idref = idref
+        self.path = path
+        self.properties = properties  # Custom properties, created on demand
+        self.attachments = None
+        self.error = ""
+        self.stack_trace = ""
+        self.name = name
+        self.reason = ""
+        self.outcome = outcome
+        self.start = start
+        self.stop = stop
+        self.duration = 0  # Updated on teardown
+        self.setup_duration = None  # Phase durations, as timed by pytest
+        self.call_duration = None
+        self.teardown_duration = None
+        self.stdout = ""
+        self.stderr = ""
+
+    @property
+    def key(self):
+        """The key of the test case, as the same test may run on several workers."""
+        return self.nodeid, self.worker
+
+    def dump(self):
+        """Dump the test case to a JSON serializable dict."""
+        event = {name: getattr(self, name) for name in self.__slots__}
+        event["start"] = self.start.strftime(TIME_FORMAT)
+        event["stop"] = self.stop.strftime(TIME_FORMAT)
+        return event
+
+    @classmethod
+    def load(cls, event):
+        """Load a test case *dump*-ed to a dict."""
+        case = cls()
+        for name in cls.__slots__:
+            if name in event:
+                setattr(case, name, event[name])
+        case.start = datetime.strptime(event["start"], TIME_FORMAT)
+        case.stop = datetime.strptime(event["stop"], TIME_FORMAT)
+        return case
+
+
+class SuiteStats(object):
+    """
+    Totals and timing of a suite of test cases.
+
+    Updated in constant time as each test case starts and completes, so they
+    can be read at any time during the run.
+    """
+
+    __slots__ = (
+        "total",
+        "passed",
+        "failure",
+        "skipped",
+        "warnings",
+        "start",
+        "stop",
+    )
+
+    def __init__(self):
+        self.total = 0
+        self.passed = 0
+        self.failure = 0
+        self.skipped = 0
+        self.warnings = 0
+        self.start = None
+        self.stop = None
+
+    def add(self, case):
+        """Count a test case once its setup is recorded."""
+        self.total += 1
+        if self.start is None or case.start < self.start:
+            self.start = case.start
+        if self.stop is None or case.stop > self.stop:
+            self.stop = case.stop
+
+    def complete(self, case):
+        """Count the outcome of a test case once its teardown is recorded."""
+        if case.outcome == "passed":
+            self.passed += 1
+        elif case.outcome == "failed":
+            self.failure += 1
+        elif case.outcome == "skipped":
+            self.skipped += 1
+        elif case.outcome == "warning":
+            self.warnings += 1
+        if case.stop > self.stop:
+            self.stop = case.stop
+
+    def remove(self, case):
+        """Discount a test case, when it is recorded again (e.g. on a rerun)."""
+        self.total -= 1
+        if case.outcome == "passed":
+            self.passed -= 1
+        elif case.outcome == "failed":
+            self.failure -= 1
+        elif case.outcome == "skipped":
+            self.skipped -= 1
+        elif case.outcome == "warning":
+            self.warnings -= 1
+
+    @property
+    def duration(self):
+        if self.start is None:
+            return 0
+        return (self.stop - self.start).total_seconds()
+
+    def dump(self):
+        """Dump the totals and timing to a JSON serializable dict."""
+        return {
+            "total": self.total,
+            "passed": self.passed,
+            "failure": self.failure,
+            "skipped": self.skipped,
+            "warnings": self.warnings,
+            "start": None if self.start is None else self.start.strftime(TIME_FORMAT),
+            "stop": None if self.stop is None else self.stop.strftime(TIME_FORMAT),
+        }
+
+    def merge(self, dump):
+        """Add the totals and timing of a suite *dump*-ed by another process."""
+        self.total += dump["total"]
+        self.passed += dump["passed"]
+        self.failure += dump["failure"]
+        self.skipped += dump["skipped"]
+        self.warnings += dump["warnings"]
+        if dump["start"] is not None:
+            start = datetime.strptime(dump["start"], TIME_FORMAT)
+            stop = datetime.strptime(dump["stop"], TIME_FORMAT)
+            if self.start is None or start < self.start:
+                self.start = start
+            if self.stop is None or stop > self.stop:
+                self.stop = stop
+
+    def as_dict(self):
+        return {
+            "error": 0,
+            "passed": self.passed,
+            "failure": self.failure,
+            "skipped": self.skipped,
+            "warnings": self.warnings,
+            "total": self.total,
+            "asserts": 0,
+        }
+
+    def module_report(self, cases):
+        """Create the report of the module with the given cases."""
+        return ModuleReport(
+            stats=self.as_dict(),
+            cases=cases,
+            start=self.start or datetime.min,
+            stop=self.stop or datetime.min,
+            duration=self.duration,
+        )
+
+
+def flush_every_arg(value):
+    """
+    Parse the ``--nunit-flush-every`` option, a number of tests (e.g. ``100``) or
+    of seconds (e.g. ``30s``), into a ``(tests, seconds)`` tuple.
+    """
+    try:
+        if value.endswith("s"):
+            every = (None, float(value[:-1]))
+        else:
+            every = (int(value), None)
+    except ValueError:
+        every = None
+    if every is None or (every[0] or every[1] or 0) <= 0:
+        raise argparse.ArgumentTypeError(
+            "expected a number of tests (e.g. 100) or seconds (e.g. 30s): "
+            "{0!r}".format(value)
+        )
+    return every
+
+
+def shard_arg(value):
+    """
+    Parse the ``--nunit-shard`` option, e.g. ``2/4``, into an ``(index, count)``
+    tuple, with the index starting at 1.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        index = count = 0
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "expected a shard and a number of shards (e.g. 2/4): {0!r}".format(value)
+        )
+    return index, count
+
+
+def describe_item(item):
+    """
+    Get the module id, label and module label of a collected test item.
+
+    Labels are the docstrings of the test and of its parent, ``None`` for nodes
+    without a Python object.
+    """
+    label = module_label = None
+    parent = item.parent
+    if parent and hasattr(parent, "obj") and parent.obj:
+        module_label = parent.obj.__doc__.strip() if parent.obj.__doc__ else ""
+    if hasattr(item, "obj") and item.obj:
+        label = item.obj.__doc__.strip() if item.obj.__doc__ else ""
+
+    if parent:
+        module_id = parent.nodeid
+    else:  # A parent-less node could happen with some custom test-collection plugins.
+        module_id = ParentlessNode
+    return module_id, label, module_label
+
+
+def budgets_arg(lines):
+    """
+    Parse the ``nunit_budgets`` option, lines of a directory and a budget in
+    milliseconds (e.g. ``tests/perf = 250``, or ``= 1000`` for all tests), into
+    ``(directory, ms)`` tuples, the most specific directories first.
+    """
+    budgets = []
+    for line in lines:
+        directory, _, ms = line.rpartition("=")
         try:
-            return min(seq)
+            ms = float(ms)
         except ValueError:
-            return default
+            raise pytest.UsageError(
+                "nunit_budgets: expected a directory and a budget in milliseconds "
+                "(e.g. tests/perf = 250): {0!r}".format(line)
+            )
+        budgets.append((directory.strip().strip("/"), ms))
+    return sorted(budgets, key=lambda budget: -len(budget[0]))
+
+
+def max_size_ini(config, name):
+    """
+    Get the ``nunit_max_*_size`` option *name*, a number of characters, 0 for no
+    limit.
+    """
+    value = config.getini(name)
+    try:
+        size = int(value)
+    except ValueError:
+        size = -1
+    if size < 0:
+        raise pytest.UsageError(
+            "{0}: expected a number of characters, 0 for no limit: {1!r}".format(
+                name, value
+            )
+        )
+    return size
+
 
-    def max_with_default(seq, default):
+def regression_ini(config, name):
+    """
+    Get the ``nunit_regression_*`` option *name*, a number, 0 to disable it.
+    """
+    value = config.getini(name)
+    try:
+        number = float(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise pytest.UsageError(
+            "{0}: expected a number, 0 to disable it: {1!r}".format(name, value)
+        )
+    return number
+
+
+def item_budget(item, budgets=()):
+    """
+    Get the budget of the call duration of a collected test item in milliseconds,
+    set with the ``nunit_budget`` marker or else for its directory in *budgets*
+    (see :func:`budgets_arg`), ``None`` for no budget.
+    """
+    marker = item.get_closest_marker("nunit_budget")
+    if marker is not None:
+        ms = marker.kwargs.get("ms", marker.args[0] if marker.args else None)
+        if ms is None:
+            raise pytest.UsageError(
+                "{0}: the nunit_budget marker requires ms=...".format(item.nodeid)
+            )
         try:
-            return max(seq)
-        except ValueError:
-            return default
+            return float(ms)
+        except (TypeError, ValueError):
+            raise pytest.UsageError(
+                "{0}: the nunit_budget marker expects a number of milliseconds: "
+                "{1!r}".format(item.nodeid, ms)
+            )
+    path = item.nodeid.split("::")[0]
+    for directory, ms in budgets:
+        if not directory or path == directory or path.startswith(directory + "/"):
+            return ms
+    return None
+
+
+def report_time(report, name):
+    """
+    Get the UTC time of the *name* (``"start"`` or ``"stop"``) of a test report.
 
-else:
-    min_with_default = min
-    max_with_default = max
+    The time is taken where the test ran (i.e. on the pytest-xdist worker). With
+    pytest before 7.3, which does not record it, the stop is now and the start is
+    back-dated by the duration of the phase.
+    """
+    timestamp = getattr(report, name, 0)
+    if timestamp:
+        return datetime.utcfromtimestamp(timestamp)
+    now = datetime.utcnow()
+    if name == "start":
+        return now - timedelta(seconds=report.duration)
+    return now
+
+
+def report_worker(report):
+    """
+    Get the id of the pytest-xdist worker which ran the test of *report*, as seen
+    on the controller, or ``None`` when run in this process.
+    """
+    node = getattr(report, "node", None)
+    if node is not None:
+        return node.workerinput["workerid"]
+    return None
+
+
+def truncate(text, limit):
+    """
+    Truncate *text* to *limit* characters, keeping its head and tail around a
+    marker with the number of characters removed. A *limit* of 0 means no limit.
+    """
+    if not limit or not isinstance(text, str) or len(text) <= limit:
+        return text
+    head = limit // 2
+    return "{0}\n... [truncated {1} characters] ...\n{2}".format(
+        text[:head], len(text) - limit, text[head - limit :]
+    )
 
 
 def pytest_addoption(parser):
@@ -65,6 +455,69 @@ def pytest_addoption(parser):
         default="",
         help="prepend prefix to classnames in nunit-xml output",
     )
+    group.addoption(
+        "--nunit-compression-level",
+        action="store",
+        dest="nunit_compresslevel",
+        metavar="level",
+        type=int,
+        default=None,
+        help="compression level of nunit-xml files ending in .gz, .bz2, .xz or .zst",
+    )
+    group.addoption(
+        "--nunit-flush-every",
+        action="store",
+        dest="nunit_flush_every",
+        metavar="N|Ts",
+        type=flush_every_arg,
+        default=None,
+        help="write a snapshot of the nunit-xml report every N tests or T seconds",
+    )
+    group.addoption(
+        "--nunit-ndjson",
+        action="store",
+        dest="nunit_ndjson",
+        metavar="path",
+        type=functools.partial(filename_arg, optname="--nunit-ndjson"),
+        default=None,
+        help="stream each completed test case as a line of JSON to the given path.",
+    )
+    group.addoption(
+        "--nunit-rerun-failed",
+        action="store",
+        dest="nunit_rerun_failed",
+        metavar="path",
+        type=functools.partial(filename_arg, optname="--nunit-rerun-failed"),
+        default=None,
+        help="only run the tests which failed in the nunit-xml report at given path.",
+    )
+    group.addoption(
+        "--nunit-history",
+        action="store",
+        dest="nunit_history",
+        metavar="path",
+        type=functools.partial(filename_arg, optname="--nunit-history"),
+        default=None,
+        help="record the durations of the tests in the SQLite history at given path.",
+    )
+    group.addoption(
+        "--nunit-shard",
+        action="store",
+        dest="nunit_shard",
+        metavar="i/N",
+        type=shard_arg,
+        default=None,
+        help="only run shard i of N, of equal duration according to --nunit-history.",
+    )
+    group.addoption(
+        "--nunit-baseline",
+        action="store",
+        dest="nunit_baseline",
+        metavar="path",
+        type=functools.partial(filename_arg, optname="--nunit-baseline"),
+        default=None,
+        help="flag tests slower than in the nunit-xml report or history at given path.",
+    )
     parser.addini(
         "nunit_suite_name", "Test suite name for NUnit report", default="pytest"
     )
@@ -85,16 +538,147 @@ def pytest_addoption(parser):
         default="any",
     )  # choices=['any', 'pass', 'fail'])
 
+    parser.addini(
+        "nunit_environment_on",
+        "Set the run environment on: one of any|suite",
+        default="any",
+    )  # choices=['any', 'suite'])
+
+    parser.addini(
+        "nunit_max_error_size",
+        "Maximum characters of the error message of a test case, 0 for no limit",
+        default="0",
+    )
+
+    parser.addini(
+        "nunit_max_stack_trace_size",
+        "Maximum characters of the stack trace of a test case, 0 for no limit",
+        default="0",
+    )
+
+    parser.addini(
+        "nunit_max_output_size",
+        "Maximum characters of the stdout and stderr of a test case, 0 for no limit",
+        default="0",
+    )
+
+    parser.addini(
+        "nunit_max_log_size",
+        "Maximum characters of the captured log of a test case, 0 for no limit",
+        default="0",
+    )
+
+    parser.addini(
+        "nunit_fsync",
+        "Flush the report to disk before renaming it into place",
+        "bool",
+        default=False,
+    )
+
+    parser.addini(
+        "nunit_streaming",
+        "Write the report one test case at a time instead of building it in memory",
+        "bool",
+        default=False,
+    )
+
+    parser.addini(
+        "nunit_suite_per_worker",
+        "Report the tests of each pytest-xdist worker in a suite of their own",
+        "bool",
+        default=False,
+    )
+
+    parser.addini(
+        "nunit_worker_rendering",
+        "Render test cases on pytest-xdist workers, the controller only joins them; "
+        "workers on other hosts send them back when finished",
+        "bool",
+        default=False,
+    )
+
+    parser.addini(
+        "nunit_budgets",
+        "Budgets of the call duration of the tests in a directory, in milliseconds: "
+        "lines of directory = ms",
+        "linelist",
+        default=[],
+    )
+
+    parser.addini(
+        "nunit_budget_warning",
+        "Report tests which pass over their budget with a Warning result",
+        "bool",
+        default=False,
+    )
+
+    parser.addini(
+        "nunit_regression_ratio",
+        "Flag tests slower than this ratio of their --nunit-baseline duration",
+        default="1.5",
+    )
+
+    parser.addini(
+        "nunit_regression_threshold",
+        "Flag tests slower than their --nunit-baseline duration by over these seconds",
+        default="0.1",
+    )
+
 
 @pytest.hookimpl(trylast=True)
 def pytest_configure(config):
     """
     Configure XML export paths and settings.
     """
+    config.addinivalue_line(
+        "markers",
+        "nunit_budget(ms): budget of the call duration of the test in milliseconds, "
+        "its overrun is recorded in the nunit-xml report",
+    )
     nunit_xmlpath = config.option.nunit_xmlpath
+    workerinput = getattr(config, "workerinput", None)
+
+    # Events are written by the plugin recording the report on the controller
+    if config.option.nunit_ndjson and not nunit_xmlpath:
+        raise pytest.UsageError("--nunit-ndjson requires --nunit-xml")
+    # Durations are compared by the plugin recording the report
+    if config.option.nunit_baseline and not nunit_xmlpath:
+        raise pytest.UsageError("--nunit-baseline requires --nunit-xml")
+    if config.option.nunit_ndjson and config.getini("nunit_worker_rendering"):
+        raise pytest.UsageError(
+            "--nunit-ndjson cannot be used with nunit_worker_rendering, "
+            "as the controller does not record the test cases"
+        )
+    # Snapshots are written by the same plugin, from the recorded test cases
+    if config.option.nunit_flush_every and config.getini("nunit_worker_rendering"):
+        raise pytest.UsageError(
+            "--nunit-flush-every cannot be used with nunit_worker_rendering, "
+            "as the controller does not record the test cases"
+        )
 
-    # prevent opening xmllog on worker nodes (xdist)
-    if nunit_xmlpath and not hasattr(config, "workerinput"):
+    if config.option.nunit_rerun_failed:
+        config._nunit_rerun_failed = _NunitRerunFailed(config.option.nunit_rerun_failed)
+        config.pluginmanager.register(config._nunit_rerun_failed)
+    if config.option.nunit_shard:
+        config._nunit_shard = _NunitShard(
+            config.option.nunit_shard, config.option.nunit_history
+        )
+        config.pluginmanager.register(config._nunit_shard)
+    # Recorded once, by the controller of pytest-xdist workers
+    if config.option.nunit_history and workerinput is None:
+        config._nunit_history = _NunitHistory(config.option.nunit_history)
+        config.pluginmanager.register(config._nunit_history)
+
+    # prevent opening xmllog on worker nodes (xdist), unless they render test cases
+    if nunit_xmlpath and (workerinput is None or "nunit_spool" in workerinput):
+        try:
+            get_compression(nunit_xmlpath)
+        except ValueError as e:
+            raise pytest.UsageError("--nunitxml: {0}".format(e))
+        try:
+            check_compresslevel(nunit_xmlpath, config.option.nunit_compresslevel)
+        except ValueError as e:
+            raise pytest.UsageError("--nunit-compression-level: {0}".format(e))
 
         filters = PytestFilters(
             keyword=config.known_args_namespace.keyword.strip(),
@@ -102,6 +686,19 @@ def pytest_configure(config):
             file_or_dir=config.known_args_namespace.file_or_dir,
         )
 
+        baseline = None
+        if config.option.nunit_baseline:
+            ratio = regression_ini(config, "nunit_regression_ratio")
+            threshold = regression_ini(config, "nunit_regression_threshold")
+            try:
+                baseline = Baseline(
+                    load_baseline(config.option.nunit_baseline),
+                    ratio=ratio,
+                    threshold=threshold,
+                )
+            except (OSError, ValueError, ET.ParseError) as e:
+                raise pytest.UsageError("--nunit-baseline: {0}".format(e))
+
         config._nunitxml = NunitXML(
             logfile=nunit_xmlpath,
             prefix=config.option.nunitprefix,
@@ -109,22 +706,197 @@ def pytest_configure(config):
             show_username=config.getini("nunit_show_username"),
             show_user_domain=config.getini("nunit_show_user_domain"),
             attach_on=config.getini("nunit_attach_on"),
+            environment_on=config.getini("nunit_environment_on"),
             filters=filters,
+            streaming=config.getini("nunit_streaming"),
+            compresslevel=config.option.nunit_compresslevel,
+            fsync=config.getini("nunit_fsync"),
+            max_error_size=max_size_ini(config, "nunit_max_error_size"),
+            max_stack_trace_size=max_size_ini(config, "nunit_max_stack_trace_size"),
+            max_output_size=max_size_ini(config, "nunit_max_output_size"),
+            max_log_size=max_size_ini(config, "nunit_max_log_size"),
+            worker_rendering=config.getini("nunit_worker_rendering"),
+            suite_per_worker=config.getini("nunit_suite_per_worker"),
+            flush_every=config.option.nunit_flush_every,
+            events_path=config.option.nunit_ndjson,
+            spool_dir=workerinput["nunit_spool"] if workerinput else None,
+            worker_id=workerinput["workerid"] if workerinput else None,
+            baseline=baseline,
+            budgets=budgets_arg(config.getini("nunit_budgets")),
+            budget_warning=config.getini("nunit_budget_warning"),
         )
         config.pluginmanager.register(config._nunitxml)
+    elif nunit_xmlpath:
+        # Collection happens on the workers, send its results to the controller
+        config._nunit_worker_collection = _NunitWorkerCollection(
+            budgets_arg(config.getini("nunit_budgets"))
+        )
+        config.pluginmanager.register(config._nunit_worker_collection)
 
 
 def pytest_unconfigure(config):
     """Unregister plugin and settings."""
+    rerun_failed = getattr(config, "_nunit_rerun_failed", None)
+    if rerun_failed:
+        del config._nunit_rerun_failed
+        config.pluginmanager.unregister(rerun_failed)
+    shard = getattr(config, "_nunit_shard", None)
+    if shard:
+        del config._nunit_shard
+        config.pluginmanager.unregister(shard)
+    history = getattr(config, "_nunit_history", None)
+    if history:
+        del config._nunit_history
+        config.pluginmanager.unregister(history)
+    worker_collection = getattr(config, "_nunit_worker_collection", None)
+    if worker_collection:
+        del config._nunit_worker_collection
+        config.pluginmanager.unregister(worker_collection)
     nunitxml = getattr(config, "_nunitxml", None)
     if nunitxml:
         del config._nunitxml
         config.pluginmanager.unregister(nunitxml)
 
 
+def read_failed(path):
+    """
+    Read the full names (node ids) of the test cases which failed in the report
+    *path*, streamed one test case at a time.
+
+    :raises pytest.UsageError: if the report cannot be read
+    """
+    failed = set()
+    try:
+        for case in iter_test_cases(path):
+            if case.result is TestStatusType.Failed:
+                failed.add(case.fullname)
+    except (OSError, ValueError, ET.ParseError) as e:
+        raise pytest.UsageError("--nunit-rerun-failed: {0}".format(e))
+    return failed
+
+
+class _NunitRerunFailed(object):
+    """
+    Deselect the tests which did not fail in a previous report, which unlike the
+    cache of ``--lf`` is usually kept by CI systems.
+    """
+
+    def __init__(self, path):
+        self.failed = read_failed(path)
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        selected, deselected = [], []
+        for item in items:
+            if item.nodeid in self.failed:
+                selected.append(item)
+            else:
+                deselected.append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+
+class _NunitShard(object):
+    """
+    Deselect the tests of the other shards, partitioned by their durations in the
+    history so the shards take about the same time.
+    """
+
+    def __init__(self, shard, history_path=None):
+        self.index, self.count = shard
+        self.history_path = history_path
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        durations = {}
+        if self.history_path and os.path.exists(self.history_path):
+            history = DurationHistory(self.history_path)
+            try:
+                durations = history.mean_durations()
+            finally:
+                history.close()
+        nodeids = [item.nodeid for item in items]
+        parts = partition(predict_durations(nodeids, durations), self.count)
+        selected, deselected = [], []
+        for item, part in zip(items, parts):
+            if part == self.index - 1:
+                selected.append(item)
+            else:
+                deselected.append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+
+class _NunitHistory(object):
+    """
+    Record the duration of each test run, the sum of its phases, in the history
+    once the session finishes. Skipped tests are not recorded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # (nodeid, worker) -> duration of the phases so far, keyed by worker too
+        # as all workers run the same tests with --dist=each
+        self.running = {}
+        self.durations = []  # (nodeid, duration) of completed tests
+
+    def pytest_runtest_logreport(self, report):
+        key = report.nodeid, report_worker(report)
+        if report.outcome == "skipped":
+            self.running.pop(key, None)
+        elif report.when == "setup":
+            self.running[key] = report.duration
+        elif key in self.running:
+            if report.when == "teardown":
+                duration = self.running.pop(key) + report.duration
+                self.durations.append((report.nodeid, duration))
+            else:
+                self.running[key] += report.duration
+
+    def pytest_sessionfinish(self):
+        history = DurationHistory(self.path)
+        try:
+            history.add(self.durations)
+        finally:
+            history.close()
+
+
+class _NunitWorkerCollection(object):
+    """
+    Send the module, labels and budget of tests collected on a pytest-xdist worker
+    to the controller, as a ``nunit_collection`` attribute of their setup report.
+
+    Test reports keep extra attributes when serialized by pytest-xdist. The
+    label of a module is only sent with the first test of the module.
+    """
+
+    def __init__(self, budgets=()):
+        self.budgets = budgets
+        self.items = {}  # nodeid -> (module id, label, module label, budget)
+        self.sent_modules = set()
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        for item in items:
+            self.items[item.nodeid] = describe_item(item) + (
+                item_budget(item, self.budgets),
+            )
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_logreport(self, report):
+        if report.when != "setup" or report.nodeid not in self.items:
+            return
+        module_id, label, module_label, budget = self.items[report.nodeid]
+        if module_id in self.sent_modules:
+            module_label = None
+        else:
+            self.sent_modules.add(module_id)
+        report.nunit_collection = (module_id, label, module_label, budget)
+
+
 class _NunitNodeReporter:
-    def __init__(self, nodeid, nunit_xml):
+    def __init__(self, nodeid, nunit_xml, worker=None):
         self.id = nodeid
+        self.key = nodeid, worker
         self.nunit_xml = nunit_xml
 
     def record_testreport(self, testreport):
@@ -132,84 +904,104 @@ class _NunitNodeReporter:
         log.debug("record_test_report:{0}".format(testreport))
 
         if testreport.when == "setup":
-            r = self.nunit_xml.cases[testreport.nodeid] = {
-                "setup-report": testreport,
-                "call-report": None,
-                "teardown-report": None,
-                "idref": self.nunit_xml.idrefindex,
-                "path": testreport.fspath,
-                "properties": {
-                    "python-version": sys.version,
-                    "fspath": testreport.fspath,
-                },
-                "attachments": None,
-                "error": "",
-                "stack-trace": "",
-                "name": self.nunit_xml.prefix + testreport.nodeid,
-                "reason": "",
-                "outcome": "",
-            }
+            self.nunit_xml.record_collection(testreport)
+            previous = self.nunit_xml.cases.get(self.key)
+            r = self.nunit_xml.cases[self.key] = CaseRecord(
+                nodeid=testreport.nodeid,
+                worker=self.key[1],
+                module_id=self.nunit_xml.module_id(testreport),
+                setup_outcome=testreport.outcome,
+                idref=self.nunit_xml.idrefindex,
+                path=testreport.fspath,
+                name=self.nunit_xml.prefix + testreport.nodeid,
+            )
             self.nunit_xml.idrefindex += 1  # Inc. node id ref counter
-            r["start"] = datetime.utcnow()  # Will be overridden if called
-            r["stop"] = datetime.utcnow()  # Will be overridden if called
-            r["duration"] = 0  # Updated on teardown
+            r.start = report_time(testreport, "start")
+            r.stop = report_time(testreport, "stop")  # Updated on teardown
+            r.setup_duration = testreport.duration
+            self.nunit_xml.add_case(r, previous)
             if testreport.outcome == "skipped":
                 log.debug("skipping : {0}".format(testreport.longrepr))
                 if (
                     isinstance(testreport.longrepr, tuple)
                     and len(testreport.longrepr) > 2
                 ):
-                    r["error"] = testreport.longrepr[2]
-                    r["stack-trace"] = "{0}::{1}".format(
+                    r.error = testreport.longrepr[2]
+                    r.stack_trace = "{0}::{1}".format(
                         testreport.longrepr[0], testreport.longrepr[1]
                     )
                 elif hasattr(
                     testreport.longrepr, "traceback"
                 ):  # Catches internal ExceptionInfo type
-                    r["error"] = str(testreport.longrepr)
-                    r["stack-trace"] = str(testreport.longrepr.traceback)
+                    r.error = str(testreport.longrepr)
+                    r.stack_trace = str(testreport.longrepr.traceback)
                 else:
-                    r["error"] = testreport.longrepr
+                    r.error = str(testreport.longrepr)
+                    reprcrash = getattr(testreport.longrepr, "reprcrash", None)
+                    if reprcrash is not None:
+                        r.stack_trace = str(reprcrash)
+                r.error = truncate(r.error, self.nunit_xml.max_error_size)
+                r.stack_trace = truncate(
+                    r.stack_trace, self.nunit_xml.max_stack_trace_size
+                )
         elif testreport.when == "call":
-            r = self.nunit_xml.cases[testreport.nodeid]
-            r["call-report"] = testreport
-            r["error"] = testreport.longreprtext
-            r["stack-trace"] = self.nunit_xml._getcrashline(testreport)
+            r = self.nunit_xml.cases[self.key]
+            r.call_outcome = testreport.outcome
+            r.call_duration = testreport.duration
+            r.error = truncate(
+                testreport.longreprtext, self.nunit_xml.max_error_size
+            )
+            r.stack_trace = truncate(
+                self.nunit_xml._getcrashline(testreport),
+                self.nunit_xml.max_stack_trace_size,
+            )
         elif testreport.when == "teardown":
-            r = self.nunit_xml.cases[testreport.nodeid]
-            r["stop"] = datetime.utcnow()
-            r["duration"] = (
-                (r["stop"] - r["start"]).total_seconds() if r["call-report"] else 0
-            )  # skipped.
-            r["teardown-report"] = testreport
-
-            if r["setup-report"].outcome == "skipped":
-                r["outcome"] = "skipped"
-            elif r["setup-report"].outcome == "failed":
-                r["outcome"] = "failed"
-            elif r["call-report"] and r["call-report"].outcome == "failed":
-                r["outcome"] = "failed"
+            r = self.nunit_xml.cases[self.key]
+            r.teardown_duration = testreport.duration
+            if getattr(testreport, "stop", 0):
+                r.stop = report_time(testreport, "stop")
+                r.duration = (r.stop - r.start).total_seconds()
+            else:
+                # pytest < 7.3: the sum of the phases, as timed where they ran, not
+                # when their reports reached this process
+                r.duration = (
+                    r.setup_duration + (r.call_duration or 0) + r.teardown_duration
+                )
+                r.stop = r.start + timedelta(seconds=r.duration)
+
+            if r.setup_outcome == "skipped":
+                r.outcome = "skipped"
+            elif r.setup_outcome == "failed":
+                r.outcome = "failed"
+            elif r.call_outcome == "failed":
+                r.outcome = "failed"
             elif testreport.outcome == "failed":
-                r["outcome"] = "failed"
+                r.outcome = "failed"
             else:
-                r["outcome"] = "passed"
-            r["stdout"] = testreport.capstdout
-            r["stderr"] = testreport.capstderr
-            r["reason"] = testreport.caplog
+                r.outcome = "passed"
+            budget = self.nunit_xml.node_budgets.get(testreport.nodeid)
+            if budget is not None:
+                self.nunit_xml.check_budget(r, budget)
+            r.stdout = truncate(testreport.capstdout, self.nunit_xml.max_output_size)
+            r.stderr = truncate(testreport.capstderr, self.nunit_xml.max_output_size)
+            r.reason = truncate(testreport.caplog, self.nunit_xml.max_log_size)
+            self.nunit_xml.complete_case(r)
         else:
             log.debug(testreport)
 
     def add_property(self, name, value):
         """Add custom property."""
-        r = self.nunit_xml.cases[self.id]
-        r["properties"][name] = value
+        r = self.nunit_xml.cases[self.key]
+        if r.properties is None:
+            r.properties = {}
+        r.properties[name] = value
 
     def add_attachment(self, file, description):
         """Add test attachment."""
-        r = self.nunit_xml.cases[self.id]
-        if r["attachments"] is None:
-            r["attachments"] = {}
-        r["attachments"][file] = description
+        r = self.nunit_xml.cases[self.key]
+        if r.attachments is None:
+            r.attachments = {}
+        r.attachments[file] = description
 
     def finalize(self):
         """Capture finalize stage (required)."""
@@ -229,7 +1021,9 @@ def record_nunit_property(request):
 
     nunitxml = getattr(request.config, "_nunitxml", None)
     if nunitxml is not None:
-        node_reporter = nunitxml.node_reporter(request.node.nodeid)
+        node_reporter = _NunitNodeReporter(
+            request.node.nodeid, nunitxml, nunitxml.worker_id
+        )
         attr_func = node_reporter.add_property
 
     return attr_func
@@ -248,7 +1042,9 @@ def add_nunit_attachment(request):
 
     nunitxml = getattr(request.config, "_nunitxml", None)
     if nunitxml is not None:
-        node_reporter = nunitxml.node_reporter(request.node.nodeid)
+        node_reporter = _NunitNodeReporter(
+            request.node.nodeid, nunitxml, nunitxml.worker_id
+        )
         attr_func = node_reporter.add_attachment
 
     return attr_func
@@ -265,64 +1061,178 @@ class NunitXML:
         show_username=False,
         show_user_domain=False,
         attach_on="any",
+        environment_on="any",
         filters=None,
+        streaming=False,
+        compresslevel=None,
+        fsync=False,
+        max_error_size=0,
+        max_stack_trace_size=0,
+        max_output_size=0,
+        max_log_size=0,
+        worker_rendering=False,
+        suite_per_worker=False,
+        flush_every=None,
+        events_path=None,
+        spool_dir=None,
+        worker_id=None,
+        baseline=None,
+        budgets=(),
+        budget_warning=False,
     ):
         logfile = os.path.expanduser(os.path.expandvars(logfile))
         self.logfile = os.path.normpath(os.path.abspath(logfile))
         self.prefix = prefix
         self.suite_name = suite_name
-        self.stats = dict.fromkeys(
-            ["error", "passed", "failure", "skipped", "total", "asserts"], 0
-        )
-        self.node_reporters = {}  # nodeid -> _NodeReporter
+        self.run_stats = SuiteStats()
+        self.module_stats = defaultdict(SuiteStats)  # module id -> SuiteStats
+        self.node_reporters = {}  # (nodeid, worker) -> reporter of running tests
         self.node_reporters_ordered = []
-        self.cases = dict()
+        self.cases = dict()  # (nodeid, worker) -> CaseRecord
         self.show_username = show_username
         self.show_user_domain = show_user_domain
         self.attach_on = attach_on
         logging.debug("Attach on criteria : {0}".format(attach_on))
+        self.environment_on = environment_on
         self.idrefindex = 100  # Create a unique ID counter
         self.filters = filters
+        self.streaming = streaming
+        self.compresslevel = compresslevel
+        self.fsync = fsync
+        self.max_error_size = max_error_size
+        self.max_stack_trace_size = max_stack_trace_size
+        self.max_output_size = max_output_size
+        self.max_log_size = max_log_size
+        self.worker_rendering = worker_rendering
+        self.suite_per_worker = suite_per_worker
+        # Set on the pytest-xdist controller when workers render test cases,
+        # and on these workers, with their id. Workers on other hosts have no
+        # spool directory, and send their files back in their output.
+        self.spool_dir = spool_dir
+        self.worker_id = worker_id
+        self.spool_files = None
+        self.worker_spool = None  # Created with the first test case rendered
+        self.crashed_workers = set()  # Of the controller, by pytest-xdist
+        self.id_prefix = worker_id + "-" if worker_id else ""
+        # Held while recording test cases, and by the thread writing snapshots
+        self.lock = threading.Lock()
+        self.snapshots = None
+        if flush_every is not None and worker_id is None:
+            self.snapshots = Snapshots(self, *flush_every)
+        self.baseline = baseline
+        self.budgets = budgets
+        self.budget_warning = budget_warning
+        self.node_budgets = {}  # nodeid -> budget in milliseconds
+        self.events = None
+        self.event_modules = set()  # Modules whose label was written
+        if events_path is not None and worker_id is None:
+            try:
+                self.events = EventWriter(events_path)
+            except OSError as e:
+                raise pytest.UsageError("--nunit-ndjson: {0}".format(e))
 
         self.node_descriptions = defaultdict(str)
         self.module_descriptions = defaultdict(str)
         self.node_to_module_map = {}
+        self.module_cases = defaultdict(dict)  # module id -> key -> CaseRecord
         self.modules = {}
 
     def finalize(self, report):
         """Finalize report (required.)"""
         nodeid = getattr(report, "nodeid", report)
-        # local hack to handle xdist report order
-        workernode = getattr(report, "node", None)
-        reporter = self.node_reporters.pop((nodeid, workernode))
+        reporter = self.node_reporters.pop((nodeid, self.worker(report)), None)
         if reporter is not None:
+            self.node_reporters_ordered.remove(reporter)
             reporter.finalize()
 
     def node_reporter(self, report):
         """Report node result."""
         nodeid = getattr(report, "nodeid", report)
-        # local hack to handle xdist report order
-        workernode = getattr(report, "node", None)
-
-        key = nodeid, workernode
+        # Keyed by worker too, as all workers run the same tests with --dist=each
+        key = nodeid, self.worker(report)
 
         if key in self.node_reporters:
-            # TODO: breaks for --dist=each
             return self.node_reporters[key]
 
-        reporter = _NunitNodeReporter(nodeid, self)
+        reporter = _NunitNodeReporter(nodeid, self, key[1])
 
         self.node_reporters[key] = reporter
         self.node_reporters_ordered.append(reporter)
 
         return reporter
 
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodeready(self, node):
+        """Label the suite of a pytest-xdist worker with its interpreter."""
+        if self.suite_per_worker:
+            info = getattr(node, "workerinfo", {})
+            self.module_descriptions[node.workerinput["workerid"]] = "{0} {1}".format(
+                info.get("executable", ""), info.get("version", "")
+            ).strip()
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node):
+        """
+        Have pytest-xdist workers render their test cases, if enabled. Only local
+        workers share the spool directory.
+        """
+        if self.worker_rendering:
+            if self.spool_dir is None:
+                self.spool_dir = tempfile.mkdtemp(prefix="pytest-nunit-")
+            spec = node.gateway.spec
+            local = spec.popen and not spec.via
+            node.workerinput["nunit_spool"] = self.spool_dir if local else None
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        """
+        Save the test cases rendered by a pytest-xdist worker on another host, and
+        note workers which crashed.
+        """
+        if error is not None:
+            self.crashed_workers.add(node.workerinput["workerid"])
+        files = getattr(node, "workeroutput", {}).get("nunit_spool")
+        if files and self.spool_dir is not None:
+            load_spool(self.spool_dir, files)
+
     def pytest_runtest_logreport(self, report):
         """Get Log report."""
+        if self.spool_dir is not None and self.worker_id is None:
+            # Recorded by the worker which ran the test, unless it crashed in it
+            if report.when == "???" and report_worker(report) in self.crashed_workers:
+                self.record_crash(report)
+            return
         reporter = self.node_reporter(report)
         reporter.record_testreport(report)
+        if report.when == "teardown":
+            # The test is complete, only its CaseRecord is kept
+            self.finalize(report)
         return reporter
 
+    def record_crash(self, report):
+        """
+        Record the test a pytest-xdist worker crashed in, as reported by
+        pytest-xdist, when workers render test cases.
+        """
+        now = datetime.utcnow()
+        key = report.nodeid, report_worker(report)
+        case = CaseRecord(
+            nodeid=report.nodeid,
+            worker=key[1],
+            module_id=self.module_id(report),
+            idref=self.idrefindex,
+            path=report.fspath,
+            name=self.prefix + report.nodeid,
+            outcome="failed",
+            start=now,
+            stop=now,
+        )
+        self.idrefindex += 1
+        case.error = truncate(str(report.longrepr), self.max_error_size)
+        self.cases[key] = case
+        self.add_case(case)
+        self.complete_case(case)
+
     def update_testcase_duration(self, report):
         """Set test case duration time."""
         reporter = self.node_reporter(report)
@@ -346,86 +1256,200 @@ class NunitXML:
             except AttributeError:
                 return ""
 
+    @property
+    def stats(self):
+        """Totals of the run so far."""
+        return self.run_stats.as_dict()
+
+    def add_case(self, case, previous=None):
+        """
+        Sort a test case into its module and count it, replacing the *previous*
+        record of the same test if any.
+        """
+        with self.lock:
+            if previous is not None:
+                self.run_stats.remove(previous)
+                self.module_stats[previous.module_id].remove(previous)
+                del self.module_cases[previous.module_id][previous.key]
+            self.module_cases[case.module_id][case.key] = case
+            self.run_stats.add(case)
+            self.module_stats[case.module_id].add(case)
+
+    def complete_case(self, case):
+        """Count the outcome of a test case."""
+        regression = None
+        if self.baseline is not None:
+            baseline = self.baseline.check(case.nodeid, case.duration)
+            if baseline is not None:
+                regression = case.nodeid, case.duration, baseline
+                if case.properties is None:
+                    case.properties = {}
+                case.properties["duration-regression"] = format_regression(
+                    case.duration, baseline
+                )
+        if self.worker_id is not None and self.spool_dir is not None:
+            if self.worker_spool is None:
+                self.worker_spool = WorkerSpool(self)
+            self.worker_spool.add(case, regression)
+        snapshot = None
+        with self.lock:
+            self.run_stats.complete(case)
+            self.module_stats[case.module_id].complete(case)
+            if self.snapshots is not None:
+                snapshot = self.snapshots.add(case)
+        if snapshot:
+            self.snapshots.flush(snapshot)
+        if self.events is not None:
+            event = case.dump()
+            event["label"] = self.node_descriptions[case.nodeid]
+            if case.module_id not in self.event_modules:
+                self.event_modules.add(case.module_id)
+                event["suite_label"] = self.module_descriptions[case.module_id]
+            self.events.write(event)
+
+    def worker(self, report):
+        """
+        Get the id of the pytest-xdist worker which ran the test of *report*, or
+        ``None`` when run in this process.
+        """
+        worker = report_worker(report)
+        return worker if worker is not None else self.worker_id
+
+    def module_id(self, report):
+        """Get the id of the module (test suite) a test report belongs to."""
+        if self.suite_per_worker:
+            worker = self.worker(report)
+            if worker is not None:
+                return worker
+        module_id = self.node_to_module_map.get(report.nodeid)
+        if module_id is None:
+            # pytest-xdist collection is done on workers,
+            # so node_to_module_map is empty
+            module_id = report.fspath if report.fspath is not None else ParentlessNode
+        return module_id
+
     def pytest_collection_modifyitems(self, session, config, items, *args):
         """Map items and test cases to make the XML output easier to read."""
         for item in items:
-            if item.parent and hasattr(item.parent, "obj") and item.parent.obj:
-                doc = item.parent.obj.__doc__.strip() if item.parent.obj.__doc__ else ""
-                self.module_descriptions[item.parent.nodeid] = doc
-            if hasattr(item, "obj") and item.obj:
-                doc = item.obj.__doc__.strip() if item.obj.__doc__ else ""
-                self.node_descriptions[item.nodeid] = doc
-
-            if item.parent:
-                self.node_to_module_map[item.nodeid] = item.parent.nodeid
-            else:  # A parent-less node could happen with some custom test-collection plugins.
-                self.node_to_module_map[item.nodeid] = ParentlessNode
+            module_id, label, module_label = describe_item(item)
+            if module_label is not None:
+                self.module_descriptions[module_id] = module_label
+            if label is not None:
+                self.node_descriptions[item.nodeid] = label
+            self.node_to_module_map[item.nodeid] = module_id
+            budget = item_budget(item, self.budgets)
+            if budget is not None:
+                self.node_budgets[item.nodeid] = budget
+
+    def record_collection(self, report):
+        """
+        Record the module, labels and budget of a test collected on a pytest-xdist
+        worker, sent along with its setup report by :class:`_NunitWorkerCollection`.
+        """
+        collection = getattr(report, "nunit_collection", None)
+        if collection is not None:
+            module_id, label, module_label, budget = collection
+            if module_label is not None:
+                self.module_descriptions[module_id] = module_label
+            if label is not None:
+                self.node_descriptions[report.nodeid] = label
+            self.node_to_module_map[report.nodeid] = module_id
+            if budget is not None:
+                self.node_budgets[report.nodeid] = budget
+
+    def check_budget(self, case, budget):
+        """
+        Record the *budget* of a completed test case and its overrun, both in
+        milliseconds, if its call took longer. A passed test case over its budget
+        is a warning with ``nunit_budget_warning``.
+        """
+        if case.call_duration is None:
+            return  # Skipped, or failed in setup
+        overrun = case.call_duration * 1000 - budget
+        if overrun <= 0:
+            return
+        if case.properties is None:
+            case.properties = {}
+        case.properties["budget"] = "{0:g}".format(budget)
+        case.properties["overrun"] = "{0:.3f}".format(overrun)
+        if self.budget_warning and case.outcome == "passed":
+            case.outcome = "warning"
 
     @classmethod
     def _create_module_report(cls, cases):
         """
         Produces a report with stats and timing information.
 
-        *cases* is a dict of dicts with all the recorded data. Keys are not
-        relevant to this method, but will be retained in the cases attribute
-        of the returned object.
+        *cases* is a dict of :class:`CaseRecord` with all the recorded data.
+        Keys are not relevant to this method, but will be retained in the cases
+        attribute of the returned object.
         """
-        stats = dict.fromkeys(
-            ["error", "passed", "failure", "skipped", "total", "asserts"], 0
-        )
-        stats["total"] = len(cases)
-        outcomes = Counter(case.get("outcome") for case in cases.values())
-        stats["passed"] = outcomes.get("passed", 0)
-        stats["failure"] = outcomes.get("failed", 0)
-        stats["skipped"] = outcomes.get("skipped", 0)
-        start = min_with_default(
-            [case["start"] for case in cases.values() if "start" in case],
-            default=datetime.min,
-        )
-        stop = max_with_default(
-            [case["stop"] for case in cases.values() if "stop" in case],
-            default=datetime.min,
-        )
-        duration = (stop - start).total_seconds()
-        return ModuleReport(
-            stats=stats, cases=cases, start=start, stop=stop, duration=duration
-        )
+        stats = SuiteStats()
+        for case in cases.values():
+            stats.add(case)
+            stats.complete(case)
+        return stats.module_report(cases)
 
     def pytest_sessionfinish(self, session, *args):
         """Wrap up test report and build output file."""
-        dirname = os.path.dirname(os.path.abspath(self.logfile))
-        if not os.path.isdir(dirname):
-            os.makedirs(dirname)
+        if self.snapshots is not None:
+            self.snapshots.stop()
+        if self.events is not None:
+            self.events.close()
         self.suite_stop_time = datetime.utcnow()
         self.suite_time_delta = (
             self.suite_stop_time - self.suite_start_time
         ).total_seconds()
+        self.write_report()
+        if self.spool_files is not None:
+            session.config.workeroutput["nunit_spool"] = self.spool_files
 
-        full_report = self._create_module_report(self.cases)
-        self.stats.update(full_report.stats)
+    def write_report(self):
+        """Write the report of the recorded test cases."""
+        # Cases are sorted into modules and counted as they are recorded
+        self.modules = {}
+        for module_id, cases in self.module_cases.items():
+            self.modules[module_id] = self.module_stats[module_id].module_report(cases)
 
-        # pytest-xdist collection is done on workers,
-        # so node_to_module_map is empty
-        if not self.node_to_module_map and self.cases:
-            for case_name, case in self.cases.items():
-                if "path" in case:
-                    self.node_to_module_map[case_name] = case["path"]
-                else:
-                    self.node_to_module_map[case_name] = ParentlessNode
+        if self.worker_id is not None:
+            if self.spool_dir is None:  # Sent back by pytest_sessionfinish
+                self.spool_files = dump_spool(self)
+            else:
+                write_spool(self)
+            return
 
-        # Sort nodes into modules
-        for module_id in set(self.node_to_module_map.values()):
-            cases = {
-                nodeid: self.cases[nodeid]
-                for nodeid, m_id in self.node_to_module_map.items()
-                if module_id == m_id and nodeid in self.cases
-            }
-            self.modules[module_id] = self._create_module_report(cases)
+        dirname = os.path.dirname(os.path.abspath(self.logfile))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
 
-        with open(self.logfile, "w", encoding="utf-8") as logfile:
-            result = NunitTestRun(self).generate_xml()
-            logfile.write(result.decode(encoding="utf-8"))
+        try:
+            if self.spool_dir is not None:
+                read_spool(self)
+                test_run = SpooledTestRun(self)
+            else:
+                test_run = NunitTestRun(self)
+
+            with open_report(self.logfile, self.compresslevel, self.fsync) as logfile:
+                if self.streaming:
+                    test_run.stream_xml(
+                        lambda chunk: logfile.write(chunk.encode("utf-8"))
+                    )
+                else:
+                    logfile.write(test_run.generate_xml())
+        finally:
+            if self.spool_dir is not None:
+                shutil.rmtree(self.spool_dir, ignore_errors=True)
+            if self.snapshots is not None:
+                self.snapshots.close()
 
     def pytest_terminal_summary(self, terminalreporter):
         """Notify XML report path."""
+        if self.baseline is not None and self.baseline.regressions:
+            terminalreporter.write_sep("=", "duration regressions")
+            for nodeid, duration, baseline in sorted(
+                self.baseline.regressions, key=lambda r: r[1] - r[2], reverse=True
+            ):
+                terminalreporter.write_line(
+                    "{0}: {1}".format(nodeid, format_regression(duration, baseline))
+                )
         terminalreporter.write_sep("-", "generated Nunit xml file: %s" % (self.logfile))
@@ -0,0 +1,166 @@
+"""
+Reading of NUnit reports into the models of :mod:`pytest_nunit.models.nunit`
+
+:func:`read` loads a whole report. :func:`iter_test_cases` streams a report one
+test case at a time, clearing the elements it has read, so reports of any size
+are read in bounded memory.
+"""
+import enum
+import xml.etree.ElementTree as ET
+
+import attr
+
+from .models import nunit as models
+from .output import read_report
+
+# Elements which may occur more than once, read into a list
+REPEATED_ELEMENTS = frozenset(
+    (
+        "test-suite",
+        "test-case",
+        "property",
+        "setting",
+        "item",
+        "assertion",
+        "attachment",
+        "test",
+    )
+)
+
+# Attributes without a type or validator in the models, field name -> type
+_ATTRIB_TYPES = {
+    (models.AssertionType, "result"): models.AssertionStatusType,
+    (models.TestCaseElementType, "site"): models.FailureSiteType,
+    (models.TestSuiteElementType, "site"): models.FailureSiteType,
+    (models.TestCaseElementType, "duration"): float,
+    (models.TestSuiteElementType, "duration"): float,
+    (models.TestRunType, "duration"): float,
+}
+
+_READERS = {}
+
+
+def _parse_bool(text):
+    return text in ("1", "true", "True")
+
+
+def _attrib_type(cls, a):
+    """The type of the value of the attrs attribute *a* of *cls*."""
+    if (cls, a.name) in _ATTRIB_TYPES:
+        return _ATTRIB_TYPES[cls, a.name]
+    if isinstance(a.type, type):
+        return a.type
+    validator = a.validator
+    if isinstance(getattr(validator, "options", None), enum.EnumMeta):
+        return validator.options
+    if isinstance(getattr(validator, "type", None), type):
+        return validator.type
+    return str
+
+
+def _converter(value_type):
+    if value_type is bool:
+        return _parse_bool
+    if isinstance(value_type, enum.EnumMeta):
+        # Rendered with the enum names
+        return value_type.__getitem__
+    return value_type
+
+
+def _element_reader(cls, a):
+    """The function reading the child elements of the attrs attribute *a*."""
+    if isinstance(a.type, str):
+        model = getattr(models, a.type, None)
+        if model is not None:
+            return lambda elem: from_element(model, elem)
+        return lambda elem: elem  # Not modelled, kept as is
+    return lambda elem: elem.text or ""
+
+
+def _reader(cls):
+    """The (cached) field readers of the attrs class *cls*."""
+    reader = _READERS.get(cls)
+    if reader is None:
+        attribs, content, elements = [], None, []
+        for a in attr.fields(cls):
+            kind, name = a.metadata["type"], a.metadata["name"]
+            if kind == "attrib":
+                attribs.append((a.name, name, _converter(_attrib_type(cls, a))))
+            elif kind == "content":
+                content = a.name
+            elif kind == "element":
+                elements.append((a.name, name, _element_reader(cls, a)))
+        reader = _READERS[cls] = (attribs, content, elements)
+    return reader
+
+
+def from_element(cls, elem):
+    """
+    Read the element *elem* into an instance of the attrs model *cls*.
+
+    Missing attributes and elements are read as ``None``, and elements which may
+    be repeated (see :data:`REPEATED_ELEMENTS`) as a list.
+
+    :raises ValueError: if an attribute has an invalid value
+    """
+    attribs, content, elements = _reader(cls)
+    kwargs = {}
+    for field, name, convert in attribs:
+        value = elem.get(name)
+        if value is not None:
+            try:
+                value = convert(value)
+            except (KeyError, ValueError):
+                raise ValueError(
+                    "Invalid {0} attribute of <{1}>: {2!r}".format(
+                        name, elem.tag, value
+                    )
+                )
+        kwargs[field] = value
+    if content is not None:
+        kwargs[content] = elem.text
+    for field, name, read_child in elements:
+        values = [read_child(child) for child in elem.iterfind(name)]
+        if name in REPEATED_ELEMENTS or len(values) > 1:
+            kwargs[field] = values or None
+        else:
+            kwargs[field] = values[0] if values else None
+    return cls(**kwargs)
+
+
+def read(path):
+    """
+    Read the report *path* as a whole.
+
+    Reports may be compressed, see :func:`pytest_nunit.output.read_report`.
+
+    :rtype: :class:`pytest_nunit.models.nunit.TestRunType`
+    """
+    with read_report(path) as fileobj:
+        root = ET.parse(fileobj).getroot()
+    if root.tag != "test-run":
+        raise ValueError("{0}: not a test run, but <{1}>".format(path, root.tag))
+    return from_element(models.TestRunType, root)
+
+
+def iter_test_cases(path):
+    """
+    Generate the test cases of the report *path*, in the order of the report.
+
+    Each test case is read once its element is complete, and then removed from
+    its parent, so only the path from the root to the current test case is held
+    in memory.
+
+    :rtype: generator of :class:`pytest_nunit.models.nunit.TestCaseElementType`
+    """
+    elements = []  # From the root to the current element
+    with read_report(path) as fileobj:
+        for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+            if event == "start":
+                elements.append(elem)
+                continue
+            elements.pop()
+            if elem.tag == "test-case":
+                yield from_element(models.TestCaseElementType, elem)
+            if elem.tag in ("test-case", "test-suite") and elements:
+                del elements[-1][:]
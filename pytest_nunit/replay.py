@@ -0,0 +1,65 @@
+"""
+Regenerate a report from the test case events of a run (``--nunit-ndjson``)
+
+Usage::
+
+    python -m pytest_nunit.replay events.ndjson report.xml
+"""
+import argparse
+from datetime import datetime
+
+from .events import read_events
+from .plugin import CaseRecord, NunitXML, PytestFilters
+
+
+def replay(events_path, logfile, **options):
+    """
+    Write the report of the test cases in the events file *events_path* to
+    *logfile*.
+
+    The run starts with the first test case and stops with the last one.
+
+    :param options: Options of :class:`pytest_nunit.plugin.NunitXML`, e.g. ``prefix``
+
+    :returns: The plugin with the test cases loaded
+    :rtype: :class:`pytest_nunit.plugin.NunitXML`
+    """
+    options.setdefault("prefix", "")
+    options.setdefault("filters", PytestFilters(None, None, None))
+    nunitxml = NunitXML(logfile, **options)
+    for event in read_events(events_path):
+        case = CaseRecord.load(event)
+        nunitxml.node_descriptions[case.nodeid] = event.get("label", "")
+        if "suite_label" in event:
+            nunitxml.module_descriptions[case.module_id] = event["suite_label"]
+        previous = nunitxml.cases.get(case.key)
+        nunitxml.cases[case.key] = case
+        nunitxml.add_case(case, previous)
+        nunitxml.complete_case(case)
+        nunitxml.idrefindex = max(nunitxml.idrefindex, case.idref + 1)
+
+    run_stats = nunitxml.run_stats
+    nunitxml.suite_start_time = run_stats.start or datetime.min
+    nunitxml.suite_stop_time = run_stats.stop or datetime.min
+    nunitxml.suite_time_delta = run_stats.duration
+    nunitxml.write_report()
+    return nunitxml
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pytest_nunit.replay", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("events", help="the events file written with --nunit-ndjson")
+    parser.add_argument("report", help="the path of the report to write")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="write the report one test case at a time",
+    )
+    args = parser.parse_args(args)
+    replay(args.events, args.report, streaming=args.streaming)
+
+
+if __name__ == "__main__":
+    main()
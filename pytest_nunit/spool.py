@@ -0,0 +1,532 @@
+"""
+Rendering of test cases ahead of the report
+
+Test cases are rendered to one fragment file per module in a spool directory,
+which are joined into test suites when writing the report:
+
+* On pytest-xdist workers, as test cases complete, which write a manifest of
+  their modules and totals, so the controller only has to join the fragments.
+  The test cases of a worker which crashed are recovered from its journal, see
+  :class:`WorkerSpool`. Workers on another host, which do not share the spool
+  directory, send the files back to the controller when they finish, see
+  :func:`dump_spool`.
+* While the run is in progress, to write snapshots of the report.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+import pytest
+
+from .attrs2xml import AttrsXmlRenderer, XmlFragment
+from .events import read_events
+from .merge import TIME_FORMAT
+from .nunit import NunitTestRun
+from .output import open_report
+
+MANIFEST_EXTENSION = ".json"
+JOURNAL_EXTENSION = ".ndjson"
+
+# The totals of a test case recovered from a journal, see SuiteStats
+JournalCase = namedtuple("JournalCase", "outcome start stop")
+
+
+def _render(test_run, case):
+    parts = []
+    AttrsXmlRenderer.stream(test_run.test_case(case), "test-case", parts.append)
+    return "".join(parts).encode("utf-8")
+
+
+def _copy_entries(source, destination, entries):
+    """
+    Copy the rendered test cases at the ``(offset, size)`` *entries* of the
+    fragment *source* to *destination*, in order.
+
+    :returns: The ``(offset, size)`` of the test cases in *destination*
+    """
+    with open(source, "rb") as fileobj:
+        data = fileobj.read()
+    copied, chunks, offset = [], [], 0
+    for start, size in entries:
+        chunks.append(data[start : start + size])
+        copied.append((offset, size))
+        offset += size
+    with open(destination, "wb") as fileobj:
+        fileobj.write(b"".join(chunks))
+    return copied
+
+
+class WorkerSpool(object):
+    """
+    The test cases of a pytest-xdist worker, rendered as they complete.
+
+    Each test case is appended to the fragment of its module, and logged with its
+    module, totals and place in the fragment as a line of JSON in the journal of
+    the worker. If the worker crashes, the controller recovers the test cases
+    completed so far from the journal, see :func:`read_spool`. The manifest
+    written by :func:`write_spool` when the worker finishes replaces it.
+
+    :param nunitxml: The plugin of the worker
+    :type  nunitxml: :class:`pytest_nunit.plugin.NunitXML`
+    """
+
+    def __init__(self, nunitxml):
+        self.nunitxml = nunitxml
+        self.test_run = NunitTestRun(nunitxml)
+        self.fragments = {}  # module id -> fragment name
+        # module id -> key -> (offset, size) of the test cases in the fragment
+        self.entries = defaultdict(dict)
+        self.stale = set()  # Modules whose fragment has replaced test cases
+        self.journal_path = os.path.join(
+            nunitxml.spool_dir, nunitxml.worker_id + JOURNAL_EXTENSION
+        )
+        self.journal = open(self.journal_path, "w", encoding="utf-8")
+
+    def add(self, case, regression=None):
+        """
+        Render a completed test case, replacing a previous record of the same test
+        (e.g. on a rerun).
+
+        :param regression: The duration regression of the test case, if any
+        :type  regression: ``tuple``
+        """
+        module_id = case.module_id
+        line = {}
+        if module_id not in self.fragments:
+            self.fragments[module_id] = "{0}-{1}.xml".format(
+                self.nunitxml.worker_id, len(self.fragments)
+            )
+            line["label"] = self.nunitxml.module_descriptions[module_id]
+        entries = self.entries[module_id]
+        if case.key in entries:
+            self.stale.add(module_id)
+        data = _render(self.test_run, case)
+        # The test case first, so the journal only lists complete test cases
+        with open(self.path(module_id), "ab") as fileobj:
+            offset = fileobj.tell()
+            fileobj.write(data)
+        entries[case.key] = (offset, len(data))
+        line.update(
+            key=case.key,
+            module=module_id,
+            fragment=self.fragments[module_id],
+            offset=offset,
+            size=len(data),
+            outcome=case.outcome,
+            start=case.start.strftime(TIME_FORMAT),
+            stop=case.stop.strftime(TIME_FORMAT),
+            regression=regression,
+        )
+        self.journal.write(json.dumps(line) + "\n")
+        self.journal.flush()
+
+    def path(self, module_id):
+        return os.path.join(self.nunitxml.spool_dir, self.fragments[module_id])
+
+    def compact(self):
+        """Drop the replaced test cases from the fragments."""
+        for module_id in self.stale:
+            path = self.path(module_id)
+            entries = self.entries[module_id]
+            copied = _copy_entries(path, path + ".tmp", list(entries.values()))
+            os.replace(path + ".tmp", path)
+            self.entries[module_id] = dict(zip(entries, copied))
+        self.stale.clear()
+
+    def close(self):
+        """Remove the journal, once replaced by the manifest."""
+        self.journal.close()
+        os.remove(self.journal_path)
+
+
+def write_spool(nunitxml):
+    """
+    Write the manifest of a worker, with its modules and totals, once its test
+    cases are rendered. Test cases which did not complete (e.g. interrupted) are
+    rendered now.
+
+    :param nunitxml: The plugin of the worker, with its modules reported
+    :type  nunitxml: :class:`pytest_nunit.plugin.NunitXML`
+    """
+    if nunitxml.worker_spool is None:
+        nunitxml.worker_spool = WorkerSpool(nunitxml)
+    spool = nunitxml.worker_spool
+    modules = []
+    for module_id, cases in nunitxml.module_cases.items():
+        for case in cases.values():
+            if case.key not in spool.entries[module_id]:
+                spool.add(case)
+        modules.append(
+            {
+                "id": module_id,
+                "label": nunitxml.module_descriptions[module_id],
+                "fragment": spool.fragments[module_id],
+                "stats": nunitxml.module_stats[module_id].dump(),
+            }
+        )
+    spool.compact()
+
+    # Written last and atomically, a worker's manifest lists complete fragments
+    manifest = os.path.join(
+        nunitxml.spool_dir, nunitxml.worker_id + MANIFEST_EXTENSION
+    )
+    regressions = nunitxml.baseline.regressions if nunitxml.baseline else []
+    with open_report(manifest) as fileobj:
+        fileobj.write(
+            json.dumps({"modules": modules, "regressions": regressions}).encode()
+        )
+    spool.close()
+
+
+def dump_spool(nunitxml):
+    """
+    Render the test cases recorded on a worker which does not share the spool
+    directory of the controller (e.g. on another host), to be sent back in the
+    output of the worker and saved with :func:`load_spool`.
+
+    :param nunitxml: The plugin of the worker, with its modules reported
+    :type  nunitxml: :class:`pytest_nunit.plugin.NunitXML`
+
+    :returns: The contents of the spool files, by file name
+    :rtype: ``dict``
+    """
+    nunitxml.spool_dir = tempfile.mkdtemp(prefix="pytest-nunit-")
+    try:
+        write_spool(nunitxml)
+        files = {}
+        for name in os.listdir(nunitxml.spool_dir):
+            with open(os.path.join(nunitxml.spool_dir, name), encoding="utf-8") as f:
+                files[name] = f.read()
+        return files
+    finally:
+        shutil.rmtree(nunitxml.spool_dir, ignore_errors=True)
+        nunitxml.spool_dir = nunitxml.worker_spool = None
+
+
+def load_spool(spool_dir, files):
+    """
+    Save the spool files of a worker, *dump*-ed by :func:`dump_spool`, into the
+    spool directory of the controller.
+    """
+    # The manifest last, so it only lists complete fragments
+    for name in sorted(files, key=lambda name: name.endswith(MANIFEST_EXTENSION)):
+        with open(os.path.join(spool_dir, name), "w", encoding="utf-8") as fileobj:
+            fileobj.write(files[name])
+
+
+def read_spool(nunitxml):
+    """
+    Load the manifests written by the workers into the modules, totals and
+    duration regressions of the controller.
+
+    The test cases completed by workers which crashed before writing their
+    manifest are recovered from their journal, see :class:`WorkerSpool`. Test
+    cases recorded by the controller itself (e.g. the test a worker crashed in)
+    are rendered along.
+
+    Modules split across workers get the fragments of every worker.
+
+    :param nunitxml: The plugin of the controller
+    :type  nunitxml: :class:`pytest_nunit.plugin.NunitXML`
+    """
+    fragments = defaultdict(list)  # module id -> fragment paths
+    names = sorted(os.listdir(nunitxml.spool_dir))
+    for name in names:
+        if name.endswith(MANIFEST_EXTENSION):
+            _read_manifest(nunitxml, name, fragments)
+        elif name.endswith(JOURNAL_EXTENSION):
+            worker_id = name[: -len(JOURNAL_EXTENSION)]
+            if worker_id + MANIFEST_EXTENSION not in names:
+                _read_journal(nunitxml, name, fragments)
+
+    test_run = NunitTestRun(nunitxml)
+    for index, (module_id, cases) in enumerate(nunitxml.module_cases.items()):
+        path = os.path.join(nunitxml.spool_dir, "controller-{0}.xml".format(index))
+        with open(path, "wb") as fileobj:
+            for case in cases.values():
+                fileobj.write(_render(test_run, case))
+        fragments[module_id].append(path)
+
+    for module_id, paths in fragments.items():
+        nunitxml.modules[module_id] = nunitxml.module_stats[module_id].module_report(
+            paths
+        )
+
+
+def _read_manifest(nunitxml, name, fragments):
+    with open(os.path.join(nunitxml.spool_dir, name), encoding="utf-8") as f:
+        manifest = json.load(f)
+    for module in manifest["modules"]:
+        module_id = module["id"]
+        nunitxml.run_stats.merge(module["stats"])
+        nunitxml.module_stats[module_id].merge(module["stats"])
+        if module["label"]:
+            nunitxml.module_descriptions[module_id] = module["label"]
+        fragments[module_id].append(
+            os.path.join(nunitxml.spool_dir, module["fragment"])
+        )
+    if nunitxml.baseline is not None:
+        nunitxml.baseline.regressions.extend(
+            tuple(regression) for regression in manifest["regressions"]
+        )
+
+
+def _read_journal(nunitxml, name, fragments):
+    """
+    Recover the test cases a worker completed before it crashed, the last record
+    of each test only.
+    """
+    latest = {}  # key -> line of the journal
+    for line in read_events(os.path.join(nunitxml.spool_dir, name)):
+        key = tuple(line["key"])
+        latest.pop(key, None)
+        latest[key] = line
+        if line.get("label"):
+            nunitxml.module_descriptions[line["module"]] = line["label"]
+
+    modules = defaultdict(list)  # (module id, fragment) -> lines
+    for line in latest.values():
+        modules[line["module"], line["fragment"]].append(line)
+        case = JournalCase(
+            outcome=line["outcome"],
+            start=datetime.strptime(line["start"], TIME_FORMAT),
+            stop=datetime.strptime(line["stop"], TIME_FORMAT),
+        )
+        for stats in (nunitxml.run_stats, nunitxml.module_stats[line["module"]]):
+            stats.add(case)
+            stats.complete(case)
+        if line["regression"] and nunitxml.baseline is not None:
+            nunitxml.baseline.regressions.append(tuple(line["regression"]))
+
+    # Copied, as the fragment may hold replaced or incomplete test cases
+    for (module_id, fragment), lines in modules.items():
+        source = os.path.join(nunitxml.spool_dir, fragment)
+        path = source[: -len(".xml")] + ".recovered.xml"
+        _copy_entries(source, path, [(line["offset"], line["size"]) for line in lines])
+        fragments[module_id].append(path)
+
+
+class SpooledTestRun(NunitTestRun):
+    """
+    A test run whose test cases were rendered ahead, see :func:`read_spool` and
+    :class:`Snapshots`
+    """
+
+    def iter_test_cases(self, module):
+        return (XmlFragment(path) for path in self.nunitxml.modules[module].cases)
+
+
+class _SnapshotRun(object):
+    """
+    The recorded run as seen by a snapshot: the test cases flushed so far with
+    their totals, the rest read from the plugin.
+    """
+
+    def __init__(self, nunitxml):
+        from .plugin import SuiteStats  # The plugin imports this module
+
+        self.nunitxml = nunitxml
+        self.run_stats = SuiteStats()
+        self.module_stats = defaultdict(SuiteStats)  # module id -> SuiteStats
+        self.modules = {}
+        self.suite_stop_time = None
+        self.suite_time_delta = 0
+
+    @property
+    def stats(self):
+        return self.run_stats.as_dict()
+
+    def __getattr__(self, name):
+        return getattr(self.nunitxml, name)
+
+
+class Snapshots(object):
+    """
+    Periodic snapshots of the report while the run is in progress, so a run which
+    is killed still leaves a valid report of the tests completed so far.
+
+    Each test case is rendered once, when complete, and appended to the fragment
+    of its module, replacing a previous record of the same test. A snapshot only
+    joins the fragments with the totals of the test cases they contain.
+
+    Snapshots every *every_seconds* are written by a background thread, so the
+    tests completed before a test which hangs are written while it hangs. The
+    ``lock`` of the plugin, under which test cases are recorded, is only held to
+    take the completed test cases. A snapshot which cannot be written is a
+    warning, and does not stop the run.
+
+    :param nunitxml: The plugin recording the run
+    :type  nunitxml: :class:`pytest_nunit.plugin.NunitXML`
+
+    :param every_tests: Write a snapshot every *every_tests* completed tests
+    :type  every_tests: ``int``
+
+    :param every_seconds: Write a snapshot every *every_seconds*, if tests
+        completed since the previous snapshot
+    :type  every_seconds: ``float``
+    """
+
+    def __init__(self, nunitxml, every_tests=None, every_seconds=None):
+        self.nunitxml = nunitxml
+        self.every_tests = every_tests
+        self.every_seconds = every_seconds
+        self.spool_dir = None  # Created with the first snapshot
+        self.fragments = {}  # module id -> fragment path
+        # module id -> key -> (offset, size) of the rendered test cases in the
+        # fragment, to replace those recorded again (e.g. on a rerun)
+        self.entries = defaultdict(dict)
+        self.flushed = {}  # key -> rendered CaseRecord
+        self.pending = []  # Completed cases, not rendered yet
+        self.failed = False  # Warned of a snapshot which could not be written
+        # Held while writing a snapshot, not to block recording test cases
+        self.write_lock = threading.Lock()
+        self.run = _SnapshotRun(nunitxml)
+        # Kept across snapshots, which share the environment computed once
+        self.test_run = SpooledTestRun(self.run)
+        self.stopped = threading.Event()
+        self.flusher = None
+        if every_seconds:
+            self.flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="pytest-nunit-snapshots",
+                daemon=True,
+            )
+            self.flusher.start()
+
+    def _flush_periodically(self):
+        while not self.stopped.wait(self.every_seconds):
+            with self.nunitxml.lock:
+                pending, self.pending = self.pending, []
+            if pending:
+                self.flush(pending)
+
+    def add(self, case):
+        """
+        Add a completed test case, and return the pending test cases if a snapshot
+        is due, to be passed to :meth:`flush` once the lock is released. Called
+        with the lock of the plugin held.
+        """
+        self.pending.append(case)
+        if self.every_tests and len(self.pending) >= self.every_tests:
+            pending, self.pending = self.pending, []
+            return pending
+        return None
+
+    def flush(self, cases):
+        """
+        Render completed test *cases*, and write a snapshot of the report.
+
+        Errors writing the snapshot are warned of once, later snapshots are
+        still attempted.
+        """
+        with self.write_lock:
+            if self.stopped.is_set():
+                return
+            try:
+                self._write(cases)
+            except OSError as e:
+                if not self.failed:
+                    self.failed = True
+                    warnings.warn(
+                        pytest.PytestWarning(
+                            "--nunit-flush-every: cannot write a snapshot of the "
+                            "report: {0}".format(e)
+                        )
+                    )
+
+    def _write(self, cases):
+        nunitxml = self.nunitxml
+        run = self.run
+        if self.spool_dir is None:
+            self.spool_dir = tempfile.mkdtemp(prefix="pytest-nunit-")
+        dirname = os.path.dirname(nunitxml.logfile)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        latest = {}  # Only the last record of a test, in the order recorded
+        for case in cases:
+            latest.pop(case.key, None)
+            latest[case.key] = case
+        pending = defaultdict(list)
+        replaced = defaultdict(set)
+        for case in latest.values():
+            previous = self.flushed.get(case.key)
+            if previous is not None:
+                for stats in (run.run_stats, run.module_stats[previous.module_id]):
+                    stats.remove(previous)
+                replaced[previous.module_id].add(case.key)
+            pending[case.module_id].append(case)
+        for module_id, keys in replaced.items():
+            self._remove(module_id, keys)
+
+        for module_id, module_cases in pending.items():
+            if module_id not in self.fragments:
+                self.fragments[module_id] = os.path.join(
+                    self.spool_dir, "{0}.xml".format(len(self.fragments))
+                )
+            entries = self.entries[module_id]
+            with open(self.fragments[module_id], "ab") as fileobj:
+                offset = fileobj.tell()
+                for case in module_cases:
+                    parts = []
+                    AttrsXmlRenderer.stream(
+                        self.test_run.test_case(case), "test-case", parts.append
+                    )
+                    data = "".join(parts).encode("utf-8")
+                    fileobj.write(data)
+                    entries[case.key] = (offset, len(data))
+                    offset += len(data)
+                    self.flushed[case.key] = case
+            # Counted once rendered, so the totals match the test cases written
+            for case in module_cases:
+                for stats in (run.run_stats, run.module_stats[module_id]):
+                    stats.add(case)
+                    stats.complete(case)
+
+        run.suite_stop_time = datetime.utcnow()
+        run.suite_time_delta = (
+            run.suite_stop_time - nunitxml.suite_start_time
+        ).total_seconds()
+        run.modules = {
+            module_id: run.module_stats[module_id].module_report([path])
+            for module_id, path in self.fragments.items()
+        }
+        with open_report(
+            nunitxml.logfile, nunitxml.compresslevel, nunitxml.fsync
+        ) as logfile:
+            self.test_run.stream_xml(
+                lambda chunk: logfile.write(chunk.encode("utf-8"))
+            )
+
+    def _remove(self, module_id, keys):
+        """Remove the rendered test cases *keys* from the fragment of a module."""
+        path = self.fragments[module_id]
+        with open(path, "rb") as fileobj:
+            data = fileobj.read()
+        entries, chunks, offset = {}, [], 0
+        for key, (start, size) in self.entries[module_id].items():
+            if key not in keys:
+                chunks.append(data[start : start + size])
+                entries[key] = (offset, size)
+                offset += size
+        with open(path, "wb") as fileobj:
+            fileobj.write(b"".join(chunks))
+        self.entries[module_id] = entries
+
+    def stop(self):
+        """Stop writing snapshots, before the final report is written."""
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        with self.write_lock:
+            pass  # Wait for a snapshot being written
+
+    def close(self):
+        """Remove the rendered test cases, once the final report is written."""
+        self.stop()
+        if self.spool_dir is not None:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
@@ -1,7 +1,16 @@
+import gzip
+import json
 import os
+import sys
+import time
+from xml.etree import ElementTree
 
+import pytest
 import xmlschema
 
+from pytest_nunit import history, replay
+from pytest_nunit.history import DurationHistory
+
 
 def test_prefix(testdir, tmpdir):
     """
@@ -39,3 +48,838 @@ def test_prefix(testdir, tmpdir):
     assert out["test-suite"]["@failed"] == 0
     assert out["test-suite"]["@skipped"] == 0
     assert out["test-suite"]["test-case"]["@name"] == "test1.test_prefix.py::test_basic"
+
+
+def test_streaming(testdir, tmpdir):
+    """
+    Test that the streaming writer produces a valid report
+    """
+    testdir.makepyfile(
+        """
+        import pytest
+
+        def test_pass():
+            assert 1 == 1
+
+        def test_fail():
+            assert 1 == 0
+
+        @pytest.mark.skip()
+        def test_skip():
+            assert 1 == 1
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest(
+        "-v", "--nunit-xml=" + outfile_pth, "-o", "nunit_streaming=true"
+    )
+    assert result.ret != 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(outfile_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    assert out["@total"] == 3, out
+    assert out["@passed"] == 1, out
+    assert out["@failed"] == 1, out
+    assert out["@skipped"] == 1, out
+    assert len(out["test-suite"]["test-case"]) == 3
+
+
+def test_environment_on_suite(testdir, tmpdir):
+    """
+    Test that nunit_environment_on=suite only sets the environment on suites
+    """
+    testdir.makepyfile(
+        """
+        def test_one():
+            assert 1 == 1
+
+        def test_two():
+            assert 1 == 1
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest(
+        "-v", "--nunit-xml=" + outfile_pth, "-o", "nunit_environment_on=suite"
+    )
+    assert result.ret == 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(outfile_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    assert out["@total"] == 2, out
+    assert "environment" in out["test-suite"]
+    for case in out["test-suite"]["test-case"]:
+        assert "environment" not in case, case
+
+
+def test_compressed(testdir, tmpdir):
+    """
+    Test that a .gz report is compressed on the fly
+    """
+    testdir.makepyfile(
+        """
+        def test_basic():
+            assert 1 == 1
+    """
+    )
+    outfile = tmpdir.join("out.xml.gz")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest(
+        "-v", "--nunit-xml=" + outfile_pth, "--nunit-compression-level=1"
+    )
+    assert result.ret == 0
+    with gzip.open(outfile_pth) as f:
+        xt = ElementTree.parse(f)
+    assert xt.getroot().get("total") == "1"
+    assert xt.getroot().find("test-suite/test-case").get("result") == "Passed"
+
+
+def test_invalid_compression_level(testdir, tmpdir):
+    """
+    Test that a compression level invalid for the report is a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    outfile_pth = str(tmpdir.join("out.xml.gz"))
+
+    result = testdir.runpytest(
+        "--nunit-xml=" + outfile_pth, "--nunit-compression-level=99"
+    )
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--nunit-compression-level:*99*.gz*"])
+    assert not os.path.exists(outfile_pth)
+
+
+def test_max_sizes(testdir, tmpdir):
+    """
+    Test that long errors and logs are truncated
+    """
+    testdir.makepyfile(
+        """
+        import logging
+
+        def test_fail():
+            logging.getLogger().warning("x" * 10000)
+            assert "a" * 10000 == "b"
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest(
+        "-v",
+        "--nunit-xml=" + outfile_pth,
+        "-o",
+        "nunit_max_error_size=100",
+        "-o",
+        "nunit_max_log_size=100",
+    )
+    result.stdout.fnmatch_lines(["*test_fail FAILED*"])
+    case = ElementTree.parse(outfile_pth).getroot().find("test-suite/test-case")
+    message = case.find("failure/message").text
+    assert "characters] ..." in message
+    assert len(message) < 200
+    assert message.startswith("def test_fail():")
+    log = case.find("output").text
+    assert "characters] ..." in log
+    assert len(log) < 200
+
+
+@pytest.mark.parametrize("value", ["abc", "-1"])
+def test_invalid_max_size(testdir, tmpdir, value):
+    """
+    Test that a size limit which is not a number of characters is a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    result = testdir.runpytest(
+        "--nunit-xml=" + str(tmpdir.join("out.xml")),
+        "-o",
+        "nunit_max_error_size=" + value,
+    )
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*nunit_max_error_size: expected a number*"])
+
+
+def test_worker_rendering(testdir, tmpdir):
+    """
+    Test that test cases rendered by pytest-xdist workers are joined into suites
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        test_one="""
+        '''First module'''
+        import pytest
+
+        def test_pass():
+            assert 1 == 1
+
+        def test_fail():
+            assert 1 == 0
+
+        @pytest.mark.skip()
+        def test_skip():
+            assert 1 == 1
+    """,
+        test_two="""
+        def test_pass():
+            assert 1 == 1
+    """,
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest(
+        "-n", "2", "--nunit-xml=" + outfile_pth, "-o", "nunit_worker_rendering=true"
+    )
+    assert result.ret != 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(outfile_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    assert out["@total"] == 4, out
+    assert out["@passed"] == 2, out
+    assert out["@failed"] == 1, out
+    assert out["@skipped"] == 1, out
+    suites = {suite["@name"]: suite for suite in out["test-suite"]}
+    assert suites["test_one.py"]["@label"] == "First module"
+    assert suites["test_one.py"]["@total"] == 3
+    assert len(suites["test_one.py"]["test-case"]) == 3
+    assert suites["test_two.py"]["@total"] == 1
+
+
+def test_worker_rendering_crash(testdir, tmpdir):
+    """
+    Test that the test cases of a worker which crashed are recovered, with the
+    test it crashed in as failed
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        test_one="""
+        import os
+
+        def test_pass_1():
+            assert 1 == 1
+
+        def test_fail():
+            assert 1 == 0
+
+        def test_pass_2():
+            assert 1 == 1
+
+        def test_crash():
+            os._exit(1)
+    """,
+        test_two="""
+        def test_pass_1():
+            assert 1 == 1
+
+        def test_pass_2():
+            assert 1 == 1
+    """,
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+
+    # One worker, which completes tests before it crashes, and its replacement
+    result = testdir.runpytest(
+        "-n", "1", "--nunit-xml=" + outfile_pth, "-o", "nunit_worker_rendering=true"
+    )
+    assert result.ret != 0
+    out = ElementTree.parse(outfile_pth).getroot()
+    assert (out.get("total"), out.get("passed"), out.get("failed")) == ("6", "4", "2")
+    cases = {case.get("name"): case for case in out.iter("test-case")}
+    assert sorted(cases) == [
+        "test_one.py::test_crash",
+        "test_one.py::test_fail",
+        "test_one.py::test_pass_1",
+        "test_one.py::test_pass_2",
+        "test_two.py::test_pass_1",
+        "test_two.py::test_pass_2",
+    ]
+    crash = cases["test_one.py::test_crash"]
+    assert crash.get("result") == "Failed"
+    assert "crashed" in crash.find("failure/message").text
+    suite = next(
+        suite
+        for suite in out.iter("test-suite")
+        if suite.get("name") == "test_one.py"
+    )
+    assert (suite.get("total"), suite.get("failed")) == ("4", "2")
+
+
+def test_worker_rendering_remote(testdir, tmpdir):
+    """
+    Test that workers which do not share the spool directory send their test
+    cases back to the controller
+    """
+    pytest.importorskip("xdist")
+    testdir.makeconftest(
+        """
+        import pytest
+
+        @pytest.hookimpl(hookwrapper=True)
+        def pytest_configure_node(node):
+            yield
+            # As for a worker on another host
+            assert node.workerinput["nunit_spool"]
+            node.workerinput["nunit_spool"] = None
+    """
+    )
+    testdir.makepyfile(
+        test_one="""
+        def test_pass():
+            assert 1 == 1
+
+        def test_fail():
+            assert 1 == 0
+    """,
+        test_two="""
+        def test_pass():
+            assert 1 == 1
+    """,
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+
+    result = testdir.runpytest(
+        "-n", "2", "--nunit-xml=" + outfile_pth, "-o", "nunit_worker_rendering=true"
+    )
+    result.assert_outcomes(passed=2, failed=1)
+    out = ElementTree.parse(outfile_pth).getroot()
+    assert out.get("total") == "3"
+    assert out.get("failed") == "1"
+    assert sorted(case.get("name") for case in out.iter("test-case")) == [
+        "test_one.py::test_fail",
+        "test_one.py::test_pass",
+        "test_two.py::test_pass",
+    ]
+
+
+def test_xdist_labels(testdir, tmpdir):
+    """
+    Test that labels and suites collected on pytest-xdist workers are reported
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        """
+        '''Module label'''
+
+        def test_pass():
+            '''Test label'''
+            assert 1 == 1
+
+        class TestClass:
+            '''Class label'''
+
+            def test_pass(self):
+                assert 1 == 1
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest("-n", "2", "--nunit-xml=" + outfile_pth)
+    assert result.ret == 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    out = xs.to_dict(outfile_pth)
+    suites = {suite["@name"]: suite for suite in out["test-suite"]}
+    assert sorted(suites) == ["test_xdist_labels.py", "test_xdist_labels.py::TestClass"]
+    assert suites["test_xdist_labels.py"]["@label"] == "Module label"
+    assert suites["test_xdist_labels.py"]["test-case"]["@label"] == "Test label"
+    assert suites["test_xdist_labels.py::TestClass"]["@label"] == "Class label"
+
+
+def test_suite_per_worker(testdir, tmpdir):
+    """
+    Test that every worker's results are kept with --dist=each
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        """
+        def test_pass():
+            assert 1 == 1
+
+        def test_fail():
+            assert 1 == 0
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest(
+        "-n",
+        "2",
+        "--dist=each",
+        "--nunit-xml=" + outfile_pth,
+        "-o",
+        "nunit_suite_per_worker=true",
+    )
+    assert result.ret != 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(outfile_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    assert out["@total"] == 4, out
+    assert out["@passed"] == 2, out
+    assert out["@failed"] == 2, out
+    suites = {suite["@name"]: suite for suite in out["test-suite"]}
+    assert sorted(suites) == ["gw0", "gw1"]
+    for worker, suite in suites.items():
+        assert suite["@total"] == 2
+        assert sys.executable in suite["@label"]
+        for case in suite["test-case"]:
+            properties = {
+                i["@name"]: i["@value"] for i in case["properties"]["property"]
+            }
+            assert properties["worker"] == worker
+
+
+def test_flush_every(testdir, tmpdir):
+    """
+    Test that a run which is killed leaves a snapshot of the completed tests
+    """
+    testdir.makepyfile(
+        """
+        import os
+
+        def test_one():
+            assert 1 == 1
+
+        def test_two():
+            assert 1 == 0
+
+        def test_three():
+            assert 1 == 1
+
+        def test_killed():
+            os._exit(1)
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest_subprocess(
+        "--nunit-xml=" + outfile_pth, "--nunit-flush-every=1"
+    )
+    assert result.ret == 1
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(outfile_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    assert out["@passed"] == 2, out
+    assert out["@failed"] == 1, out
+    assert [case["@name"] for case in out["test-suite"]["test-case"]] == [
+        "test_flush_every.py::test_one",
+        "test_flush_every.py::test_two",
+        "test_flush_every.py::test_three",
+    ]
+
+
+def test_flush_every_seconds(testdir, tmpdir):
+    """
+    Test that a snapshot of the completed tests is written while a test hangs
+    """
+    testdir.makepyfile(
+        """
+        import time
+
+        def test_one():
+            assert 1 == 1
+
+        def test_hangs():
+            time.sleep(60)
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+
+    process = testdir.popen(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-p",
+            "no:cacheprovider",
+            "--nunit-xml=" + outfile_pth,
+            "--nunit-flush-every=0.1s",
+        ]
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(outfile_pth) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert process.poll() is None, "the hanging test should still run"
+    finally:
+        process.kill()
+        process.wait()
+    out = ElementTree.parse(outfile_pth).getroot()
+    # The hanging test is in neither the test cases nor the totals of the snapshot
+    assert out.get("total") == "1"
+    assert out.get("passed") == "1"
+    assert [case.get("name") for case in out.iter("test-case")] == [
+        "test_flush_every_seconds.py::test_one"
+    ]
+
+
+def test_flush_every_error(testdir, tmpdir):
+    """
+    Test that a snapshot which cannot be written is a warning, not an error
+    """
+    testdir.makepyfile(
+        """
+        import os
+
+        def test_block():
+            open(os.environ["REPORT_DIR"], "w").close()
+
+        def test_unblock():
+            os.remove(os.environ["REPORT_DIR"])
+    """
+    )
+    report_dir = tmpdir.join("reports")
+    testdir.monkeypatch.setenv("REPORT_DIR", str(report_dir))
+    outfile_pth = str(report_dir.join("out.xml"))
+
+    result = testdir.runpytest("--nunit-xml=" + outfile_pth, "--nunit-flush-every=1")
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines(["*--nunit-flush-every: cannot write a snapshot*"])
+    out = ElementTree.parse(outfile_pth).getroot()
+    assert out.get("total") == "2"
+
+
+def test_flush_every_usage(testdir, tmpdir):
+    """
+    Test that an invalid snapshot interval, or snapshots which would not be
+    written, are a usage error
+    """
+    result = testdir.runpytest(
+        "--nunit-xml=" + str(tmpdir.join("out.xml")), "--nunit-flush-every=soon"
+    )
+    assert result.ret == 4
+    result.stderr.fnmatch_lines(["*--nunit-flush-every: expected a number*"])
+
+    result = testdir.runpytest(
+        "--nunit-xml=" + str(tmpdir.join("out.xml")),
+        "--nunit-flush-every=10",
+        "-o",
+        "nunit_worker_rendering=true",
+    )
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--nunit-flush-every cannot be used with*"])
+
+
+def test_ndjson_replay(testdir, tmpdir):
+    """
+    Test that the events of a run are replayed into the same report
+    """
+    testdir.makepyfile(
+        """
+        '''Module label'''
+        import pytest
+
+        def test_pass(record_nunit_property):
+            '''Test label'''
+            record_nunit_property("key", "value")
+
+        def test_fail():
+            assert 1 == 0
+
+        @pytest.mark.skip()
+        def test_skip():
+            assert 1 == 1
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+    events_pth = str(tmpdir.join("events.ndjson"))
+
+    result = testdir.runpytest(
+        "--nunit-xml=" + outfile_pth, "--nunit-ndjson=" + events_pth
+    )
+    assert result.ret != 0
+    with open(events_pth) as events_file:
+        events = [json.loads(line) for line in events_file]
+    assert [event["outcome"] for event in events] == ["passed", "failed", "skipped"]
+
+    replayed_pth = str(tmpdir.join("replayed.xml"))
+    replay.main([events_pth, replayed_pth])
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(replayed_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    replayed = xs.to_dict(replayed_pth)
+    for key in ("@total", "@passed", "@failed", "@skipped"):
+        assert replayed[key] == out[key]
+    assert replayed["test-suite"]["@label"] == "Module label"
+    assert replayed["test-suite"]["test-case"] == out["test-suite"]["test-case"]
+
+
+def test_rerun_failed(testdir, tmpdir):
+    """
+    Test that only the tests which failed in a previous report are run again
+    """
+    testdir.makepyfile(
+        """
+        import pytest
+
+        def test_pass():
+            assert 1 == 1
+
+        @pytest.mark.parametrize("value", [1, 2])
+        def test_param(value):
+            assert value == 1
+
+        class TestClass:
+            def test_fail(self):
+                assert 1 == 0
+    """
+    )
+    previous_pth = str(tmpdir.join("previous.xml.gz"))
+    result = testdir.runpytest("--nunit-xml=" + previous_pth)
+    result.assert_outcomes(passed=2, failed=2)
+
+    outfile_pth = str(tmpdir.join("out.xml"))
+    result = testdir.runpytest(
+        "-v", "--nunit-rerun-failed=" + previous_pth, "--nunit-xml=" + outfile_pth
+    )
+    result.assert_outcomes(failed=2)
+    assert result.parseoutcomes()["deselected"] == 2
+    result.stdout.fnmatch_lines(
+        ["*::test_param[[]2[]] FAILED*", "*::TestClass::test_fail FAILED*"]
+    )
+    out = ElementTree.parse(outfile_pth).getroot()
+    assert out.get("total") == "2"
+
+
+def test_rerun_failed_missing_report(testdir, tmpdir):
+    """
+    Test that a report which cannot be read is a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    result = testdir.runpytest(
+        "--nunit-rerun-failed=" + str(tmpdir.join("missing.xml"))
+    )
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--nunit-rerun-failed:*missing.xml*"])
+
+
+def test_history_shards(testdir, tmpdir):
+    """
+    Test that durations are recorded in the history, and that shards planned from
+    it split the tests by duration
+    """
+    testdir.makepyfile(
+        """
+        import time
+
+        import pytest
+
+        @pytest.mark.parametrize(
+            "value", [0.2, 0.01, 0.01, 0.01], ids=["slow", "fast1", "fast2", "fast3"]
+        )
+        def test_sleep(value):
+            time.sleep(value)
+
+        @pytest.mark.skip()
+        def test_skip():
+            pass
+    """
+    )
+    history_pth = str(tmpdir.join("history.db"))
+    result = testdir.runpytest("--nunit-history=" + history_pth)
+    result.assert_outcomes(passed=4, skipped=1)
+    store = DurationHistory(history_pth)
+    try:
+        durations = store.mean_durations()
+    finally:
+        store.close()
+    assert sorted(durations) == [
+        "test_history_shards.py::test_sleep[fast1]",
+        "test_history_shards.py::test_sleep[fast2]",
+        "test_history_shards.py::test_sleep[fast3]",
+        "test_history_shards.py::test_sleep[slow]",
+    ]
+    assert durations["test_history_shards.py::test_sleep[slow]"] >= 0.2
+
+    shard = testdir.runpytest(
+        "-v", "--nunit-shard=1/2", "--nunit-history=" + history_pth
+    )
+    shard.assert_outcomes(passed=1)
+    assert shard.parseoutcomes()["deselected"] == 4
+    shard.stdout.fnmatch_lines(["*::test_sleep[[]slow[]] PASSED*"])
+    shard = testdir.runpytest(
+        "-v", "--nunit-shard=2/2", "--nunit-history=" + history_pth
+    )
+    shard.assert_outcomes(passed=3, skipped=1)
+    assert shard.parseoutcomes()["deselected"] == 1
+
+
+def test_history_dist_each(testdir, tmpdir):
+    """
+    Test that the duration of every worker is recorded with --dist=each
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        """
+        import time
+
+        def test_sleep():
+            time.sleep(0.05)
+    """
+    )
+    history_pth = str(tmpdir.join("history.db"))
+    result = testdir.runpytest(
+        "-n", "2", "--dist=each", "--nunit-history=" + history_pth
+    )
+    assert result.ret == 0
+    store = DurationHistory(history_pth)
+    try:
+        stats = store.get("test_history_dist_each.py::test_sleep")
+    finally:
+        store.close()
+    assert stats.count == 2
+    assert stats.mean >= 0.05
+
+
+def test_history_from_report(testdir, tmpdir):
+    """
+    Test that the history is fed from reports
+    """
+    testdir.makepyfile(
+        """
+        def test_pass():
+            pass
+
+        def test_fail():
+            assert 1 == 0
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+    testdir.runpytest("--nunit-xml=" + outfile_pth)
+    history_pth = str(tmpdir.join("history.db"))
+    history.main([history_pth, outfile_pth, outfile_pth])
+    store = DurationHistory(history_pth)
+    try:
+        stats = store.get("test_history_from_report.py::test_fail")
+    finally:
+        store.close()
+    assert stats.count == 2
+
+
+def test_shard_usage(testdir):
+    """
+    Test that an invalid shard is a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    result = testdir.runpytest("--nunit-shard=3/2")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+
+
+def test_ndjson_usage(testdir, tmpdir):
+    """
+    Test that events which would not be written are a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    events_pth = str(tmpdir.join("events.ndjson"))
+
+    result = testdir.runpytest("--nunit-ndjson=" + events_pth)
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--nunit-ndjson requires --nunit-xml*"])
+
+    result = testdir.runpytest(
+        "--nunit-xml=" + str(tmpdir.join("out.xml")),
+        "--nunit-ndjson=" + events_pth,
+        "-o",
+        "nunit_worker_rendering=true",
+    )
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--nunit-ndjson cannot be used with*"])
+    assert not os.path.exists(events_pth)
+
+
+def test_baseline_usage(testdir, tmpdir):
+    """
+    Test that a baseline without a report to flag regressions in is a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    result = testdir.runpytest("--nunit-baseline=" + str(tmpdir.join("base.xml")))
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--nunit-baseline requires --nunit-xml*"])
+
+
+def test_budget_usage(testdir, tmpdir):
+    """
+    Test that a budget which is not a number of milliseconds is a usage error
+    """
+    testdir.makepyfile(
+        """
+        import pytest
+
+        @pytest.mark.nunit_budget(ms="abc")
+        def test_pass():
+            pass
+    """
+    )
+    result = testdir.runpytest("--nunit-xml=" + str(tmpdir.join("out.xml")))
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(
+        ["*test_budget_usage.py::test_pass: the nunit_budget marker expects*'abc'*"]
+    )
+
+
+def test_regression_ratio_usage(testdir, tmpdir):
+    """
+    Test that a regression ratio which is not a number is a usage error
+    """
+    testdir.makepyfile("def test_pass(): pass")
+    result = testdir.runpytest(
+        "--nunit-xml=" + str(tmpdir.join("out.xml")),
+        "--nunit-baseline=" + str(tmpdir.join("base.xml")),
+        "-o",
+        "nunit_regression_ratio=abc",
+    )
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*nunit_regression_ratio: expected a number*"])
@@ -0,0 +1,99 @@
+"""
+Test merging of sharded reports
+"""
+import os
+from xml.etree import ElementTree
+
+import xmlschema
+
+from pytest_nunit import merge
+
+
+def test_merge_shards(testdir, tmpdir):
+    """
+    Test that shards of a run merge into the report of the whole run
+    """
+    testdir.makepyfile(
+        """
+        '''Module label'''
+        import pytest
+
+        def test_pass():
+            assert 1 == 1
+
+        def test_fail():
+            assert 1 == 0
+
+        @pytest.mark.skip()
+        def test_skip():
+            assert 1 == 1
+
+        class TestClass:
+            def test_pass(self):
+                assert 1 == 1
+    """
+    )
+    shards = [str(tmpdir.join("shard-1.xml")), str(tmpdir.join("shard-2.xml.gz"))]
+    testdir.runpytest("--nunit-xml=" + shards[0], "-k", "test_pass")
+    testdir.runpytest("--nunit-xml=" + shards[1], "-k", "not test_pass")
+    outfile_pth = str(tmpdir.join("merged.xml"))
+
+    merge.main(["-o", outfile_pth] + shards)
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(outfile_pth)
+    assert xs.is_valid(xt), xs.validate(xt)
+    out = xs.to_dict(outfile_pth)
+    assert out["@total"] == 4, out
+    assert out["@passed"] == 2, out
+    assert out["@failed"] == 1, out
+    assert out["@skipped"] == 1, out
+    assert out["@result"] == "Failed", out
+    suites = {suite["@name"]: suite for suite in out["test-suite"]}
+    module = suites["test_merge_shards.py"]
+    assert module["@label"] == "Module label"
+    assert module["@total"] == 3
+    assert module["@passed"] == 1
+    assert module["@failed"] == 1
+    assert [case["@name"] for case in module["test-case"]] == [
+        "test_merge_shards.py::test_pass",
+        "test_merge_shards.py::test_fail",
+        "test_merge_shards.py::test_skip",
+    ]
+    assert module["properties"]["property"][0]["@name"] == "python_version"
+    assert suites["test_merge_shards.py::TestClass"]["@total"] == 1
+    ids = [case.get("id") for case in xt.iter("test-case")]
+    assert ids == ["100", "102", "103", "101"]
+
+
+def test_merge_large_suite(testdir, tmpdir):
+    """
+    Test that the elements of a suite which follow its test cases are kept, for a
+    suite larger than the read buffer of the parser
+    """
+    testdir.makepyfile(
+        """
+        import pytest
+
+        @pytest.mark.parametrize("value", range(500))
+        def test_value(value):
+            pass
+    """
+    )
+    shard = str(tmpdir.join("shard.xml"))
+    testdir.runpytest("--nunit-xml=" + shard)
+    assert os.path.getsize(shard) > 1 << 16
+    outfile_pth = str(tmpdir.join("merged.xml"))
+
+    merge.main(["-o", outfile_pth, shard])
+    (suite,) = ElementTree.parse(outfile_pth).getroot().iter("test-suite")
+    assert [child.tag for child in suite if child.tag != "test-case"] == [
+        "properties",
+        "environment",
+    ]
+    assert len(suite.findall("test-case")) == 500
@@ -2,7 +2,9 @@
 Test adding properties to tests
 """
 import os
+from datetime import datetime
 
+import pytest
 import xmlschema
 
 
@@ -355,3 +357,237 @@ def test_no_docstring(testdir, tmpdir):
     assert out["test-suite"]["@skipped"] == 0
     assert out["test-suite"]["@label"] == ""
     assert out["test-suite"]["test-case"]["@label"] == ""
+
+
+def test_phase_durations(testdir, tmpdir):
+    """
+    Test that setup, call and teardown durations are recorded separately
+    """
+    testdir.makepyfile(
+        """
+        import time
+        import pytest
+
+        @pytest.fixture
+        def slow_fixture():
+            time.sleep(0.5)
+            yield
+            time.sleep(0.25)
+
+        def test_basic(slow_fixture):
+            assert 1 == 1
+
+        @pytest.mark.skip
+        def test_skipped():
+            pass
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    result = testdir.runpytest("-v", "--nunit-xml=" + outfile_pth)
+    assert result.ret == 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    out = xs.to_dict(outfile_pth)
+    cases = {case["@name"]: case for case in out["test-suite"]["test-case"]}
+    properties = {
+        i["@name"]: i["@value"]
+        for i in cases["test_phase_durations.py::test_basic"]["properties"]["property"]
+    }
+    assert float(properties["setup-duration"]) >= 0.5
+    assert float(properties["call-duration"]) < 0.25
+    assert float(properties["teardown-duration"]) >= 0.25
+    assert cases["test_phase_durations.py::test_basic"]["@duration"] >= 0.75
+
+    properties = {
+        i["@name"]
+        for i in cases["test_phase_durations.py::test_skipped"]["properties"][
+            "property"
+        ]
+    }
+    assert "setup-duration" in properties
+    assert "call-duration" not in properties
+
+
+def test_phase_durations_without_times(testdir, tmpdir):
+    """
+    Test that the duration of a test is the sum of its phases with pytest
+    versions whose reports have no start and stop times
+    """
+    testdir.makeconftest(
+        """
+        import pytest
+
+        @pytest.hookimpl(hookwrapper=True)
+        def pytest_runtest_makereport(item, call):
+            outcome = yield
+            report = outcome.get_result()
+            report.__dict__.pop("start", None)
+            report.__dict__.pop("stop", None)
+    """
+    )
+    testdir.makepyfile(
+        """
+        import time
+        import pytest
+
+        @pytest.fixture
+        def slow_fixture():
+            time.sleep(0.5)
+            yield
+            time.sleep(0.25)
+
+        def test_basic(slow_fixture):
+            assert 1 == 1
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+
+    result = testdir.runpytest("-v", "--nunit-xml=" + outfile_pth)
+    assert result.ret == 0
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    out = xs.to_dict(outfile_pth)
+    case = out["test-suite"]["test-case"]
+    assert 0.75 <= case["@duration"] < 5
+    start = datetime.strptime(case["@start-time"], "%Y-%m-%d %H:%M:%S.%f")
+    end = datetime.strptime(case["@end-time"], "%Y-%m-%d %H:%M:%S.%f")
+    assert (end - start).total_seconds() == pytest.approx(float(case["@duration"]))
+
+
+def test_duration_regression(testdir, tmpdir, monkeypatch):
+    """
+    Test that tests slower than in the baseline report are flagged
+    """
+    testdir.makepyfile(
+        """
+        import os
+        import time
+
+        def test_slower():
+            time.sleep(float(os.environ["SLOWER_DELAY"]))
+
+        def test_same():
+            time.sleep(0.01)
+    """
+    )
+    baseline_pth = str(tmpdir.join("baseline.xml"))
+    monkeypatch.setenv("SLOWER_DELAY", "0.01")
+    testdir.runpytest("--nunit-xml=" + baseline_pth)
+
+    outfile_pth = str(tmpdir.join("out.xml"))
+    monkeypatch.setenv("SLOWER_DELAY", "0.3")
+    result = testdir.runpytest(
+        "--nunit-xml=" + outfile_pth, "--nunit-baseline=" + baseline_pth
+    )
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(
+        [
+            "*= duration regressions =*",
+            "test_duration_regression.py::test_slower: 0.3*s, x*",
+        ]
+    )
+    assert "::test_same:" not in result.stdout.str()
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    out = xs.to_dict(outfile_pth)
+    regressions = {
+        case["@name"]: [
+            i["@value"]
+            for i in case["properties"]["property"]
+            if i["@name"] == "duration-regression"
+        ]
+        for case in out["test-suite"]["test-case"]
+    }
+    assert regressions["test_duration_regression.py::test_same"] == []
+    (regression,) = regressions["test_duration_regression.py::test_slower"]
+    assert regression.startswith("0.3")
+
+
+def test_budget(testdir, tmpdir):
+    """
+    Test that tests over their budget get budget and overrun properties, and are
+    warnings with nunit_budget_warning
+    """
+    testdir.makeini(
+        """
+        [pytest]
+        nunit_budgets =
+            = 1000
+            perf = 1
+        nunit_budget_warning = true
+    """
+    )
+    testdir.mkpydir("perf").join("test_perf.py").write(
+        "import time\n"
+        "def test_directory():\n"
+        "    time.sleep(0.05)\n"
+        "def test_failed():\n"
+        "    time.sleep(0.05)\n"
+        "    assert False\n"
+    )
+    testdir.makepyfile(
+        """
+        import time
+        import pytest
+
+        @pytest.mark.nunit_budget(ms=1)
+        def test_marker():
+            time.sleep(0.05)
+
+        @pytest.mark.nunit_budget(ms=10000)
+        def test_within():
+            time.sleep(0.05)
+
+        def test_default():
+            time.sleep(0.05)
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+
+    result = testdir.runpytest("--strict-markers", "--nunit-xml=" + outfile_pth)
+    result.assert_outcomes(passed=4, failed=1)
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    out = xs.to_dict(outfile_pth)
+    cases, warnings = {}, 0
+    for suite in out["test-suite"]:
+        warnings += suite["@warnings"]
+        for case in suite["test-case"]:
+            properties = {
+                i["@name"]: i["@value"] for i in case["properties"]["property"]
+            }
+            cases[case["@name"].split("::")[-1]] = (
+                case["@result"],
+                properties.get("budget"),
+                properties.get("overrun"),
+            )
+    assert warnings == 2
+    assert cases["test_within"] == ("Passed", None, None)
+    assert cases["test_default"] == ("Passed", None, None)
+    result, budget, overrun = cases["test_marker"]
+    assert (result, budget) == ("Warning", "1")
+    assert float(overrun) >= 40
+    assert cases["test_directory"][:2] == ("Warning", "1")
+    assert cases["test_failed"][:2] == ("Failed", "1")
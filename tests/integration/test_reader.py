@@ -0,0 +1,89 @@
+"""
+Test reading reports into the models
+"""
+import os
+from xml.etree import ElementTree
+
+import xmlschema
+
+from pytest_nunit import reader
+from pytest_nunit.attrs2xml import AttrsXmlRenderer
+from pytest_nunit.models import nunit as models
+
+
+def test_read_report(testdir, tmpdir):
+    """
+    Test that a report reads into the models, which render a valid report again
+    """
+    testdir.makepyfile(
+        """
+        import pytest
+
+        def test_pass(record_nunit_property):
+            record_nunit_property("owner", "me")
+
+        def test_fail():
+            assert 1 == 0
+
+        @pytest.mark.skip(reason="not today")
+        def test_skip():
+            pass
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml.gz"))
+    testdir.runpytest("--nunit-xml=" + outfile_pth)
+
+    test_run = reader.read(outfile_pth)
+    assert test_run.total == 3
+    assert test_run.failed == 1
+    (suite,) = test_run.test_suite
+    assert suite.name == "test_read_report.py"
+    assert [case.result for case in suite.test_case] == [
+        models.TestStatusType.Passed,
+        models.TestStatusType.Failed,
+        models.TestStatusType.Skipped,
+    ]
+    passed, failed, skipped = suite.test_case
+    assert {p.name: p.value for p in passed.properties.property}["owner"] == "me"
+    assert "assert 1 == 0" in failed.failure.message
+    assert skipped.reason.message is not None
+
+    rendered = str(tmpdir.join("rendered.xml"))
+    with open(rendered, "wb") as fileobj:
+        fileobj.write(AttrsXmlRenderer.render(test_run, "test-run"))
+    xs = xmlschema.XMLSchema(
+        os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            "../../ext/nunit-src/TestResult.xsd",
+        ),
+        validation="lax",
+    )
+    xt = ElementTree.parse(rendered)
+    assert xs.is_valid(xt), xs.validate(xt)
+    assert reader.read(rendered) == test_run
+
+
+def test_iter_test_cases(testdir, tmpdir):
+    """
+    Test that the test cases of a report are read one at a time
+    """
+    testdir.makepyfile(
+        """
+        def test_a():
+            pass
+
+        class TestClass:
+            def test_b(self):
+                assert False
+    """
+    )
+    outfile_pth = str(tmpdir.join("out.xml"))
+    testdir.runpytest("--nunit-xml=" + outfile_pth)
+
+    cases = reader.iter_test_cases(outfile_pth)
+    first = next(cases)
+    assert first.name == "test_iter_test_cases.py::test_a"
+    assert first.result is models.TestStatusType.Passed
+    assert [(case.name, case.result) for case in cases] == [
+        ("test_iter_test_cases.py::TestClass::test_b", models.TestStatusType.Failed)
+    ]
@@ -6,9 +6,9 @@ from datetime import datetime, timedelta
 
 import pytest
 
-from pytest_nunit.plugin import NunitXML
+from pytest_nunit.plugin import CaseRecord, NunitXML
 
-# This class method takes a dict of node_id->dict representing all the
+# This class method takes a dict of node_id->CaseRecord representing all the
 # information we collected in _NunitNodeReporter, and returns a
 # ModuleReport (based on all the provided cases)
 create_report = NunitXML._create_module_report
@@ -29,11 +29,7 @@ class _TestMaker:
         start = self.now
         self.now = stop = start + timedelta(seconds=duration)
 
-        return {
-            "outcome": outcome,
-            "start": start,
-            "stop": stop,
-        }
+        return CaseRecord(outcome=outcome, start=start, stop=stop)
 
 
 @pytest.fixture()
@@ -222,3 +222,28 @@ def test_failing_fixture(testdir, tmpdir):
     assert "".join(result.stderr.lines) == ""
     result.stdout.fnmatch_lines(["*test_one ERROR*"])
     result.stdout.fnmatch_lines(["*test_two XFAIL*"])
+
+
+def test_unicode_failure(testdir, tmpdir):
+    """
+    Test that non-ASCII failure messages are written as UTF-8
+    """
+    testdir.makepyfile(
+        """
+        # -*- coding: utf-8 -*-
+        def test_unicode():
+            assert "Grüße" == "Hälsningar"
+    """
+    )
+    outfile = tmpdir.join("out.xml")
+    outfile_pth = str(outfile)
+
+    for streaming in ("false", "true"):
+        result = testdir.runpytest(
+            "-v", "--nunit-xml=" + outfile_pth, "-o", "nunit_streaming=" + streaming
+        )
+        result.stdout.fnmatch_lines(["*test_unicode FAILED*"])
+        with open(outfile_pth, "rb") as f:
+            content = f.read().decode("utf-8")
+        assert "Grüße" in content
+        assert "Hälsningar" in content
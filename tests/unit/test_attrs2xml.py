@@ -0,0 +1,210 @@
+"""
+Test rendering of attrs models to XML
+"""
+import xml.etree.ElementTree as ET
+
+from pytest_nunit import attrs2xml
+from pytest_nunit.attrs2xml import (
+    AttrsXmlRenderer,
+    CdataComment,
+    XmlFragment,
+    tostring,
+)
+from pytest_nunit.models import nunit as models
+
+
+def make_case(i):
+    return models.TestCaseElementType(
+        id_=str(i),
+        name="test_{0}".format(i),
+        fullname="module.py::test_{0}".format(i),
+        methodname="test_{0}".format(i),
+        properties=models.PropertyBagType(
+            property=[models.PropertyType(name="fspath", value='a "quoted" <path>')]
+        ),
+        environment=None,
+        settings=None,
+        failure=models.FailureType(
+            message=CdataComment(text="assert 1 == 2 & more"),
+            stack_trace=CdataComment(text="module.py:1"),
+        ),
+        reason=models.ReasonType(message=CdataComment(text="")),
+        output=CdataComment(text="line\nline"),
+        assertions=None,
+        attachments=None,
+        classname="module.py",
+        runstate=models.TestRunStateType.Runnable,
+        seed="0",
+        result=models.TestStatusType.Failed,
+        label="",
+        site=None,
+        start_time="",
+        end_time="",
+        duration=0.5,
+        asserts=0,
+    )
+
+
+def make_suite(cases):
+    return models.TestSuiteElementType(
+        id_="module.py",
+        name="module.py",
+        fullname="module.py",
+        methodname="",
+        classname="",
+        test_suite=None,
+        properties=models.PropertyBagType(
+            property=[models.PropertyType(name="a", value="b")]
+        ),
+        environment=None,
+        settings=None,
+        failure=None,
+        reason=None,
+        output=None,
+        assertions=None,
+        attachments=None,
+        test_case=cases,
+        runstate=models.TestRunStateType.Runnable,
+        type_=models.TestSuiteTypeType.Assembly,
+        testcasecount=3,
+        result=models.TestStatusType.Passed,
+        label="Module\ndescription",
+        site=None,
+        start_time="",
+        end_time="",
+        duration=1.5,
+        asserts=0,
+        total=3,
+        passed=0,
+        failed=3,
+        warnings=0,
+        inconclusive=0,
+        skipped=0,
+    )
+
+
+def test_stream_matches_render():
+    """
+    Test that streaming lazily generated cases gives the same document
+    """
+    expected = AttrsXmlRenderer.render(
+        make_suite([make_case(i) for i in range(3)]), "test-suite"
+    )
+    chunks = []
+    AttrsXmlRenderer.stream(
+        make_suite(make_case(i) for i in range(3)), "test-suite", chunks.append
+    )
+    assert len(chunks) > 3
+    assert "".join(chunks).encode("utf-8") == expected
+
+
+def test_stream_consumes_lazily():
+    """
+    Test that each case is written before the next one is generated
+    """
+    chunks = []
+
+    def cases():
+        for i in range(3):
+            yield make_case(i)
+            assert "".join(chunks).count("<test-case ") == i + 1
+
+    AttrsXmlRenderer.stream(make_suite(cases()), "test-suite", chunks.append)
+
+
+def test_serializer_is_cached():
+    """
+    Test that the serializer of a model class is built once
+    """
+    serializer = AttrsXmlRenderer.serializer(models.PropertyType)
+    assert AttrsXmlRenderer.serializer(models.PropertyType) is serializer
+
+
+def test_compiled_serializer():
+    """
+    Test enums, content, missing required elements and nested models
+    """
+    run = models.TestRunType(
+        id_="2",
+        testcasecount=1,
+        result=models.TestResultType.Passed,
+        total=1,
+        passed=1,
+        failed=0,
+        inconclusive=0,
+        skipped=0,
+        asserts=0,
+        command_line="pytest -k <x>",
+        filter_=None,
+        test_case=None,
+        test_suite=None,
+        start_time=None,
+        end_time=None,
+        duration=None,
+        engine_version=None,
+        clr_version=None,
+    )
+    assert AttrsXmlRenderer.render(run, "test-run") == (
+        b'<test-run id="2" testcasecount="1" result="Passed" total="1" passed="1" '
+        b'failed="0" inconclusive="0" skipped="0" asserts="0">'
+        b"<command-line>pytest -k &lt;x&gt;</command-line><filter /></test-run>"
+    )
+    name = models.ValueMatchFilterType(name="basic", re=0)
+    assert AttrsXmlRenderer.render(name, "name") == b'<name re="0">basic</name>'
+
+
+def test_writer_escapes():
+    """
+    Test that the writer escapes like ElementTree does (from Python 3.9)
+    """
+    root = ET.Element("root", {"a": 'x "y"\r\n\t<&>', "b": ""})
+    ET.SubElement(root, "child").text = "a < b & c > d\n"
+    ET.SubElement(root, "empty")
+    root.text = "text"
+    assert tostring(root) == (
+        '<root a="x &quot;y&quot;&#13;&#10;&#09;&lt;&amp;&gt;" b="">text'
+        "<child>a &lt; b &amp; c &gt; d\n</child><empty /></root>"
+    )
+
+
+def test_writer_cdata():
+    """
+    Test that CDATA sections are written natively
+    """
+    # The Element class of CdataComment, which may differ from that of ET when
+    # the C and pure Python implementations are mixed
+    root = attrs2xml.ET.Element("failure")
+    message = CdataComment(text="a < b\x1b")
+    message.tag = "message"
+    root.append(message)
+    assert tostring(root) == (
+        "<failure><message><![CDATA[a &lt; b&#x1b;]]></message></failure>"
+    )
+
+
+def test_fragments(tmpdir):
+    """
+    Test that pre-rendered cases are copied in place, whether streamed or not
+    """
+    fragment = tmpdir.join("cases.xml")
+    cases = [AttrsXmlRenderer.render(make_case(i), "test-case") for i in range(3)]
+    fragment.write_binary(b"".join(cases))
+    expected = AttrsXmlRenderer.render(
+        make_suite([make_case(i) for i in range(3)]), "test-suite"
+    )
+    suite = make_suite([XmlFragment(str(fragment))])
+    assert AttrsXmlRenderer.render(suite, "test-suite") == expected
+    chunks = []
+    suite = make_suite(iter([XmlFragment(str(fragment))]))
+    AttrsXmlRenderer.stream(suite, "test-suite", chunks.append)
+    assert "".join(chunks).encode("utf-8") == expected
+
+
+def test_render_leaves_elementtree_alone():
+    """
+    Test that rendering does not patch the global ElementTree serializer
+    """
+    serialize_xml = ET._serialize_xml
+    AttrsXmlRenderer.render(make_case(1), "test-case")
+    assert ET._serialize_xml is serialize_xml
+    assert ET._serialize["xml"] is serialize_xml
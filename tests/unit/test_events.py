@@ -0,0 +1,57 @@
+"""
+Test the stream of test case events
+"""
+import time
+
+from pytest_nunit.events import EventWriter, read_events
+
+
+def test_round_trip(tmpdir):
+    """
+    Test that events are read back as written
+    """
+    path = str(tmpdir.join("events.ndjson"))
+    writer = EventWriter(path)
+    writer.write({"nodeid": "a.py::test_1", "properties": {"k": object}})
+    writer.write({"nodeid": "a.py::test_2"})
+    writer.close()
+    assert list(read_events(path)) == [
+        {"nodeid": "a.py::test_1", "properties": {"k": str(object)}},
+        {"nodeid": "a.py::test_2"},
+    ]
+
+
+def test_missing_directory(tmpdir):
+    """
+    Test that the directory of the events is created
+    """
+    path = str(tmpdir.join("reports", "events.ndjson"))
+    writer = EventWriter(path)
+    writer.write({"nodeid": "a.py::test_1"})
+    writer.close()
+    assert list(read_events(path)) == [{"nodeid": "a.py::test_1"}]
+
+
+def test_periodic_flush(tmpdir):
+    """
+    Test that events reach the file without closing the writer
+    """
+    path = str(tmpdir.join("events.ndjson"))
+    writer = EventWriter(path, flush_interval=0.01)
+    try:
+        writer.write({"nodeid": "a.py::test_1"})
+        deadline = time.monotonic() + 5
+        while not tmpdir.join("events.ndjson").read() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert list(read_events(path)) == [{"nodeid": "a.py::test_1"}]
+    finally:
+        writer.close()
+
+
+def test_incomplete_line(tmpdir):
+    """
+    Test that the last line of an interrupted writer is ignored
+    """
+    path = tmpdir.join("events.ndjson")
+    path.write('{"nodeid": "a.py::test_1"}\n{"nodeid": "a.py::te')
+    assert list(read_events(str(path))) == [{"nodeid": "a.py::test_1"}]
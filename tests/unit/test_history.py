@@ -0,0 +1,92 @@
+"""
+Test the history of test durations, the planning of shards and baselines
+"""
+import statistics
+
+import pytest
+
+from pytest_nunit.baseline import Baseline, load_baseline
+from pytest_nunit.history import (WINDOW, DurationHistory, partition,
+                                  predict_durations)
+
+
+def test_rolling_stats(tmpdir):
+    """
+    Test that the statistics of a test roll over runs and persist, as the plain
+    mean and variance of the first runs
+    """
+    path = str(tmpdir.join("history.db"))
+    durations = [1.0, 2.5, 3.0, 7.25]
+    history = DurationHistory(path)
+    history.add([("a.py::test_a", d) for d in durations[:2]])
+    history.close()
+    history = DurationHistory(path)
+    history.add([("a.py::test_a", d) for d in durations[2:]])
+    stats = history.get("a.py::test_a")
+    assert stats.count == 4
+    assert stats.mean == pytest.approx(statistics.mean(durations))
+    assert stats.stddev == pytest.approx(statistics.pstdev(durations))
+    assert stats.last == 7.25
+    assert history.get("a.py::test_b") is None
+    history.close()
+
+
+def test_old_durations_age_out(tmpdir):
+    """
+    Test that the statistics follow a test which got slower
+    """
+    history = DurationHistory(str(tmpdir.join("history.db")))
+    history.add([("a.py::test_a", 1.0)] * 100)
+    history.add([("a.py::test_a", 2.0)] * (WINDOW * 5))
+    stats = history.get("a.py::test_a")
+    assert stats.count == 100 + WINDOW * 5
+    assert stats.mean == pytest.approx(2.0, abs=0.01)
+    assert stats.stddev < 0.1
+    history.close()
+
+
+def test_partition():
+    """
+    Test that the heaviest items are spread first, over the lightest parts
+    """
+    weights = [1, 5, 2, 4, 3, 3, 2]
+    parts = partition(weights, 3)
+    loads = [sum(w for w, p in zip(weights, parts) if p == part) for part in range(3)]
+    assert sorted(loads) == [6, 7, 7]
+    assert partition(weights, 3) == parts
+
+
+def test_predict_durations():
+    """
+    Test that tests without history take the mean of the known tests
+    """
+    durations = {"test_a": 1.0, "test_b": 3.0}
+    assert predict_durations(["test_a", "test_b", "test_c"], durations) == [
+        1.0,
+        3.0,
+        2.0,
+    ]
+    assert predict_durations(["test_c", "test_d"], {}) == [1.0, 1.0]
+
+
+def test_baseline():
+    """
+    Test that only tests slower by both the ratio and the threshold regress
+    """
+    baseline = Baseline({"slow": 1.0, "fast": 0.001}, ratio=1.5, threshold=0.1)
+    assert baseline.check("slow", 1.4) is None
+    assert baseline.check("slow", 1.6) == 1.0
+    assert baseline.check("fast", 0.05) is None
+    assert baseline.check("new", 10.0) is None
+    assert baseline.regressions == [("slow", 1.6, 1.0)]
+
+
+def test_baseline_from_history(tmpdir):
+    """
+    Test that a history is loaded as a baseline of its mean durations
+    """
+    path = str(tmpdir.join("history.db"))
+    history = DurationHistory(path)
+    history.add([("a.py::test_a", 1.0), ("a.py::test_a", 2.0)])
+    history.close()
+    assert load_baseline(path) == {"a.py::test_a": 1.5}
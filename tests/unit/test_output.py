@@ -0,0 +1,123 @@
+"""
+Test opening of report files
+"""
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from pytest_nunit import output
+
+
+@pytest.mark.parametrize(
+    "name, decompress",
+    [
+        ("out.xml", lambda data: data),
+        ("out.xml.gz", gzip.decompress),
+        ("out.xml.bz2", bz2.decompress),
+        ("out.xml.xz", lzma.decompress),
+    ],
+)
+def test_open_report(tmpdir, name, decompress):
+    """
+    Test that reports are compressed according to their extension
+    """
+    path = str(tmpdir.join(name))
+    with output.open_report(path, compresslevel=1) as f:
+        f.write(b"<test-run />")
+    with open(path, "rb") as f:
+        assert decompress(f.read()) == b"<test-run />"
+
+
+@pytest.mark.parametrize(
+    "name", ["out.xml", "out.xml.gz", "out.xml.bz2", "out.xml.xz", "out.xml.zst"]
+)
+def test_read_report(tmpdir, name):
+    """
+    Test that reports are decompressed according to their extension
+    """
+    if name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    path = str(tmpdir.join(name))
+    with output.open_report(path) as f:
+        f.write(b"<test-run />")
+    with output.read_report(path) as f:
+        assert f.read() == b"<test-run />"
+
+
+def test_default_level(tmpdir):
+    """
+    Test that the compression level is optional
+    """
+    path = str(tmpdir.join("out.xml.gz"))
+    with output.open_report(path) as f:
+        f.write(b"<test-run />")
+    with gzip.open(path) as f:
+        assert f.read() == b"<test-run />"
+
+
+def test_zstd(tmpdir):
+    """
+    Test .zst reports, which require zstandard
+    """
+    path = str(tmpdir.join("out.xml.zst"))
+    if output.zstandard is None:
+        with pytest.raises(ValueError):
+            output.get_compression(path)
+        return
+    with output.open_report(path, compresslevel=1) as f:
+        f.write(b"<test-run />")
+    with open(path, "rb") as f:
+        reader = output.zstandard.ZstdDecompressor().stream_reader(f)
+        assert reader.read() == b"<test-run />"
+
+
+def test_atomic(tmpdir):
+    """
+    Test that the report replaces the previous one once complete
+    """
+    path = str(tmpdir.join("out.xml"))
+    with open(path, "wb") as f:
+        f.write(b"<previous />")
+    with output.open_report(path, fsync=True) as f:
+        f.write(b"<test-run>")
+        with open(path, "rb") as previous:
+            assert previous.read() == b"<previous />"
+        f.write(b"</test-run>")
+    with open(path, "rb") as f:
+        assert f.read() == b"<test-run></test-run>"
+    assert tmpdir.listdir() == [tmpdir.join("out.xml")]
+
+
+def test_atomic_failure(tmpdir):
+    """
+    Test that a failed write leaves the previous report in place
+    """
+    path = str(tmpdir.join("out.xml.gz"))
+    with pytest.raises(RuntimeError):
+        with output.open_report(path) as f:
+            f.write(b"<test-run>")
+            raise RuntimeError()
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize(
+    "name, level, valid",
+    [
+        ("out.xml", 99, True),
+        ("out.xml.gz", 9, True),
+        ("out.xml.gz", 99, False),
+        ("out.xml.bz2", 0, False),
+        ("out.xml.xz", -1, False),
+    ],
+)
+def test_check_compresslevel(name, level, valid):
+    """
+    Test that compression levels are checked for the compression of the report
+    """
+    if valid:
+        output.check_compresslevel(name, level)
+    else:
+        with pytest.raises(ValueError):
+            output.check_compresslevel(name, level)
@@ -0,0 +1,152 @@
+"""
+Test recording of test reports by the plugin
+"""
+import gc
+import weakref
+import xml.etree.ElementTree as ET
+
+from _pytest.reports import TestReport
+
+from pytest_nunit.plugin import NunitXML, PytestFilters
+
+
+def make_nunitxml(tmpdir):
+    return NunitXML(logfile=str(tmpdir.join("out.xml")), prefix="")
+
+
+def make_reports(nodeid, outcome="passed"):
+    """
+    Make the setup, call and teardown reports of a test
+    """
+    location = (nodeid.split("::")[0], 1, nodeid.split("::")[-1])
+    longrepr = "long traceback " * 100 if outcome == "failed" else None
+    return [
+        TestReport(nodeid, location, {}, "passed", None, "setup"),
+        TestReport(nodeid, location, {}, outcome, longrepr, "call"),
+        TestReport(nodeid, location, {}, "passed", None, "teardown"),
+    ]
+
+
+def test_reports_are_released(tmpdir):
+    """
+    Test that test reports are not retained once recorded
+    """
+    nunitxml = make_nunitxml(tmpdir)
+    reports = make_reports("test_module.py::test_fail", outcome="failed")
+    refs = [weakref.ref(report) for report in reports]
+    for report in reports:
+        nunitxml.pytest_runtest_logreport(report)
+    del reports, report
+    gc.collect()
+    assert [ref() for ref in refs] == [None, None, None]
+
+    case = nunitxml.cases[("test_module.py::test_fail", None)]
+    assert case.outcome == "failed"
+    assert case.error.startswith("long traceback")
+
+
+def record(nunitxml, nodeid, outcome="passed"):
+    for report in make_reports(nodeid, outcome):
+        nunitxml.pytest_runtest_logreport(report)
+
+
+def nodeids(cases):
+    return [case.nodeid for case in cases.values()]
+
+
+def test_module_grouping(tmpdir):
+    """
+    Test that cases are grouped by the parent node found during collection
+    """
+    nunitxml = make_nunitxml(tmpdir)
+    nunitxml.node_to_module_map.update(
+        {
+            "a.py::test_1": "a.py",
+            "a.py::TestA::test_2": "a.py::TestA",
+            "a.py::test_3": "a.py",
+        }
+    )
+    record(nunitxml, "a.py::test_1")
+    record(nunitxml, "a.py::TestA::test_2")
+    record(nunitxml, "a.py::test_3", outcome="failed")
+    assert list(nunitxml.module_cases) == ["a.py", "a.py::TestA"]
+    assert nodeids(nunitxml.module_cases["a.py"]) == ["a.py::test_1", "a.py::test_3"]
+    assert nodeids(nunitxml.module_cases["a.py::TestA"]) == ["a.py::TestA::test_2"]
+
+
+def test_module_grouping_without_collection(tmpdir):
+    """
+    Test that cases are grouped by file when collected elsewhere (pytest-xdist)
+    """
+    nunitxml = make_nunitxml(tmpdir)
+    record(nunitxml, "a.py::test_1")
+    record(nunitxml, "b.py::test_2")
+    record(nunitxml, "a.py::TestA::test_3")
+    assert list(nunitxml.module_cases) == ["a.py", "b.py"]
+    assert nodeids(nunitxml.module_cases["a.py"]) == [
+        "a.py::test_1",
+        "a.py::TestA::test_3",
+    ]
+
+
+def test_stats_are_live(tmpdir):
+    """
+    Test that run and module totals are kept up to date while recording
+    """
+    nunitxml = make_nunitxml(tmpdir)
+    record(nunitxml, "a.py::test_1")
+    record(nunitxml, "b.py::test_2", outcome="failed")
+    assert nunitxml.stats["total"] == 2
+    assert nunitxml.stats["passed"] == 1
+    assert nunitxml.stats["failure"] == 1
+    assert nunitxml.module_stats["a.py"].as_dict()["passed"] == 1
+    assert nunitxml.module_stats["b.py"].as_dict()["failure"] == 1
+
+    # A test recorded again (e.g. rerun) replaces its previous result
+    record(nunitxml, "b.py::test_2")
+    assert nunitxml.stats["total"] == 2
+    assert nunitxml.stats["passed"] == 2
+    assert nunitxml.stats["failure"] == 0
+    assert nodeids(nunitxml.module_cases["b.py"]) == ["b.py::test_2"]
+    assert nunitxml.module_stats["b.py"].duration >= 0
+
+
+def test_snapshots_replace_reruns(tmpdir):
+    """
+    Test that a test recorded again replaces its test case in snapshots
+    """
+    nunitxml = NunitXML(
+        logfile=str(tmpdir.join("out.xml")),
+        prefix="",
+        filters=PytestFilters(keyword="", markers="", file_or_dir=[]),
+        flush_every=(1, None),
+    )
+    nunitxml.pytest_sessionstart()
+    try:
+        record(nunitxml, "a.py::test_1", outcome="failed")
+        record(nunitxml, "a.py::test_2")
+        record(nunitxml, "a.py::test_1")
+        root = ET.parse(str(tmpdir.join("out.xml"))).getroot()
+    finally:
+        nunitxml.snapshots.close()
+    assert (root.get("total"), root.get("passed"), root.get("failed")) == (
+        "2",
+        "2",
+        "0",
+    )
+    assert [case.get("name") for case in root.iter("test-case")] == [
+        "a.py::test_2",
+        "a.py::test_1",
+    ]
+
+
+def test_reporters_are_released(tmpdir):
+    """
+    Test that node reporters are freed once a test is complete
+    """
+    nunitxml = make_nunitxml(tmpdir)
+    for i in range(100):
+        record(nunitxml, "a.py::test_{0}".format(i))
+        assert nunitxml.node_reporters == {}
+        assert nunitxml.node_reporters_ordered == []
+    assert len(nunitxml.cases) == 100
@@ -0,0 +1,30 @@
+from pytest_nunit.plugin import truncate
+
+
+def test_no_limit():
+    """
+    Test that a limit of 0 keeps the whole text
+    """
+    assert truncate("x" * 1000, 0) == "x" * 1000
+
+
+def test_short_text():
+    """
+    Test that text within the limit is kept as is
+    """
+    assert truncate("abcdef", 6) == "abcdef"
+
+
+def test_head_and_tail():
+    """
+    Test that the head and tail are kept around a marker
+    """
+    assert truncate("abcdefghij", 4) == "ab\n... [truncated 6 characters] ...\nij"
+    assert truncate("abcdefghij", 3) == "a\n... [truncated 7 characters] ...\nij"
+
+
+def test_not_text():
+    """
+    Test that values which are not text are left alone
+    """
+    assert truncate(None, 4) is None